@@ -0,0 +1,172 @@
+import argparse
+import functools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from trajectory_core import generate_path_trajectory, generate_trajectory, scenarios
+from trajectory_export import write_trajectory_csv
+
+# Benchmarks of the hot paths: generating every registered scenario at several
+# discretizations and lengths, CSV export, the tuner's plot array conversion and its
+# slider callback (driven headless with the Agg backend).
+#
+# Every benchmark reports throughput in points per second and the peak memory traced
+# while it runs once. Results can be saved as a baseline; later runs are compared with it
+# and fail when throughput drops or peak memory grows by more than the tolerance.
+# Baselines are machine specific, so save a fresh one before comparing on another machine;
+# the default tolerance is wide enough for the timing noise of a shared machine.
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DISCRETIZATIONS = (1.0, 0.5, 0.1)
+LENGTH_FACTORS = (1, 10)
+ROUND_TIME_S = 0.1
+ROUNDS = 7
+
+class Benchmark:
+    def __init__(self, name, points, func):
+        self.name = name
+        self.points = points
+        self.func = func
+
+def _generate(scenario, length, discretization_m):
+    if scenario.path is not None:
+        return generate_path_trajectory(scenario.path, discretization_m, scenario.initial_speed,
+            scenario.final_speed, scenario.speed_increments, scenario.speed_max,
+            scenario.stopping_decel, num_points_max=math.inf)
+    return generate_trajectory(length, discretization_m, scenario.initial_speed,
+        scenario.final_speed, scenario.heading_rate_increments, scenario.heading_phases,
+        scenario.speed_increments, scenario.speed_max, scenario.stopping_decel,
+        scenario.heading_rate_max, num_points_max=math.inf)
+
+def generation_benchmarks():
+    for name in sorted(scenarios):
+        scenario = scenarios[name]
+        # a closed-form path has a fixed length
+        for factor in LENGTH_FACTORS if scenario.path is None else (1,):
+            for discretization_m in DISCRETIZATIONS:
+                length = scenario.length * factor
+                func = functools.partial(_generate, scenario, length, discretization_m)
+                yield Benchmark("generate/{}/{:g}m@{:g}m".format(name, length, discretization_m),
+                    len(func()), func)
+
+def export_benchmarks(directory):
+    path = os.path.join(directory, "trajectory.csv")
+    for discretization_m in (1.0, 0.01):
+        trajectory = _generate(scenarios['lane_change'], 100.0, discretization_m)
+        yield Benchmark("export/csv/{}".format(len(trajectory)), len(trajectory),
+            functools.partial(write_trajectory_csv, path, trajectory))
+
+def plot_benchmarks():
+    import matplotlib
+    matplotlib.use('Agg')
+    import trajectory_planner
+
+    for discretization_m in (1.0, 0.01):
+        trajectory = _generate(scenarios['lane_change'], 100.0, discretization_m)
+        yield Benchmark("plot/set_plot_arrays/{}".format(len(trajectory)), len(trajectory),
+            functools.partial(trajectory_planner.set_plot_arrays, trajectory))
+
+    # every slider move regenerates: no export, no coalescing and no cache hits
+    trajectory_planner.export_path = False
+    trajectory_planner.frame_interval_s = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        trajectory_planner.plot_trajectory(trajectory_planner.get_trajectory())
+    trajectory_planner.fig.canvas.draw()
+    slider = trajectory_planner.sliders['heading_rate_increments']
+    values = np.linspace(slider.valmin, slider.valmax, 64)
+    moves = iter(range(sys.maxsize))
+
+    def move_slider():
+        trajectory_planner.trajectory_cache.clear()
+        slider.set_val(values[next(moves) % len(values)])
+    yield Benchmark("plot/update_trajectory_plot", len(trajectory_planner.x), move_slider)
+
+# returns (seconds per call, peak traced bytes)
+def measure(benchmark):
+    benchmark.func()
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            benchmark.func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= ROUND_TIME_S:
+            break
+        calls *= 2
+    best = elapsed
+    for _ in range(ROUNDS - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            benchmark.func()
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        benchmark.func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best / calls, peak
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark generation, export and plotting.")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+        help="store these results as the new baseline instead of comparing")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+        help="allowed relative throughput drop / peak memory growth")
+    args = parser.parse_args(args)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    failed = False
+    print("{:<52} {:>7} {:>11} {:>13} {:>10}  {}".format('benchmark', 'points', 'us/call',
+        'points/s', 'peak KiB', 'vs baseline'))
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = [generation_benchmarks(), export_benchmarks(directory), plot_benchmarks()]
+        for benchmark in (b for group in benchmarks for b in group):
+            if args.filter not in benchmark.name:
+                continue
+            seconds, peak = measure(benchmark)
+            points_per_second = benchmark.points / seconds
+            results[benchmark.name] = {'points': benchmark.points,
+                'points_per_second': points_per_second, 'peak_bytes': peak}
+
+            status = ''
+            reference = baseline.get(benchmark.name)
+            if reference is not None and not args.save_baseline:
+                ratio = points_per_second / reference['points_per_second']
+                status = "{:.2f}x".format(ratio)
+                if ratio < 1 - args.tolerance:
+                    status += " SLOWER"
+                    failed = True
+                if peak > reference['peak_bytes'] * (1 + args.tolerance) + 64 * 1024:
+                    status += " MORE MEMORY"
+                    failed = True
+            print("{:<52} {:>7} {:>11.1f} {:>13,.0f} {:>10.1f}  {}".format(benchmark.name,
+                benchmark.points, seconds * 1e6, points_per_second, peak / 1024, status))
+
+    # a filtered run only replaces the baselines of the benchmarks it ran
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("baseline saved to " + args.baseline)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
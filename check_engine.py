@@ -0,0 +1,153 @@
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from trajectory_core import TRAJECTORY_FIELDS, Trajectory, scenarios
+
+# Compares the vectorized engine with a frozen copy of the per-point loop it replaced, on
+# random parameter sets of every phase scenario, and fails if any column drifts. Run it
+# after changing the kernels in trajectory_core.py or speed_profile.py.
+#
+# Both the batch path and the single-trajectory path (which steps short profiles point by
+# point) are checked. Values are compared like np.allclose: |engine - reference| must stay
+# within ABSOLUTE_TOLERANCE + RELATIVE_TOLERANCE * |reference|. The relative part matters
+# for time_from_start after a crawl to a standstill, where a point can lie 1e5 s out and
+# summation order alone moves it by more than 1e-8 s.
+
+ABSOLUTE_TOLERANCE = 1e-8
+RELATIVE_TOLERANCE = 1e-8
+
+# The generation loop as it was before the engine, with plotting and CSV writing stripped
+# and the hard-coded heading phases read from heading_phases. Do not change it to follow
+# the engine: it is what the engine is checked against.
+def reference_trajectory(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments=0.15, speed_max=35.0,
+        stopping_decel=1.0, heading_rate_max=1.0, num_points_max=None):
+    if num_points_max is None:
+        num_points_max = Trajectory.capacity
+    heading_rate = 0.0
+    num_points = int(length / discretization_m)
+    if num_points > num_points_max:
+        num_points = num_points_max
+    discretization_distance_m = float(length / num_points)
+
+    rows = [(0.0, 0.0, 0.0, 0.0, initial_speed, 0.0, 0.0)]
+    decelerating = False
+    speed = initial_speed
+    seconds = 0.0
+    if speed > 0:
+        seconds = float(discretization_distance_m / speed)
+    cur_x = 0.0
+    cur_y = 0.0
+    heading_angle = 0.0
+    prev_heading_angle = heading_angle
+    prev_speed = speed
+
+    for i in range(2, num_points + 1):
+        if not decelerating:
+            speed += speed_increments
+            next_speed = speed + speed_increments
+            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
+            predicted_stopping_distance = next_speed * predicted_stopping_time \
+                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
+            if ((num_points - i - 1) * discretization_distance_m) <= predicted_stopping_distance:
+                decelerating = True
+        speed = min(speed, speed_max)
+        if speed > 0:
+            dt = float(discretization_distance_m / speed)
+            seconds += dt
+            if decelerating:
+                speed -= stopping_decel * dt
+                speed = max(final_speed, speed)
+
+        for start_fraction, end_fraction, direction, limit in heading_phases:
+            if i >= round(num_points * start_fraction) and i < round(num_points * end_fraction):
+                heading_angle += direction * heading_rate
+                heading_rate += heading_rate_increments
+                heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
+                if limit is not None:
+                    heading_angle = min(heading_angle, limit) if direction > 0 \
+                        else max(heading_angle, limit)
+                break
+
+        cur_x += discretization_m * math.cos(heading_angle)
+        cur_y += discretization_m * math.sin(heading_angle)
+        rows.append((seconds, cur_x, cur_y, math.radians(heading_angle), speed,
+            (speed - prev_speed) / seconds, (heading_angle - prev_heading_angle) / seconds))
+        prev_heading_angle = heading_angle
+        prev_speed = speed
+    return np.array(rows)
+
+# random parameter sets across the slider ranges, with standing starts and stops mixed in
+def random_parameters(scenario, count, rng):
+    initial_speed = rng.uniform(*scenario.initial_speed_range, count)
+    final_speed = rng.uniform(*scenario.final_speed_range, count)
+    heading_rate_increments = rng.uniform(*scenario.heading_rate_increments_range, count)
+    initial_speed[rng.random(count) < 0.1] = 0.0
+    final_speed[rng.random(count) < 0.2] = 0.0
+    return initial_speed, final_speed, heading_rate_increments
+
+# returns (largest deviation, worst deviation relative to the tolerance); the check passes
+# while the second stays at or below 1
+def compare(engine, reference):
+    deviation = np.abs(engine - reference)
+    both_nan = np.isnan(engine) & np.isnan(reference)
+    deviation = np.where(both_nan, 0.0, deviation)
+    allowed = ABSOLUTE_TOLERANCE + RELATIVE_TOLERANCE * np.abs(np.nan_to_num(reference))
+    return float(deviation.max()), float((deviation / allowed).max())
+
+def check_scenario(scenario, count, singles, rng):
+    initial_speed, final_speed, heading_rate_increments = random_parameters(scenario, count, rng)
+    args = (scenario.length, scenario.discretization_m)
+    options = dict(speed_increments=scenario.speed_increments, speed_max=scenario.speed_max,
+        stopping_decel=scenario.stopping_decel, heading_rate_max=scenario.heading_rate_max,
+        num_points_max=scenario.num_points_max)
+    batch = scenario.generate_batch(initial_speed, final_speed, heading_rate_increments)
+
+    worst = np.zeros((2, len(TRAJECTORY_FIELDS)))
+    worst_ratio = 0.0
+    for k in range(count):
+        reference = reference_trajectory(*args, initial_speed[k], final_speed[k],
+            heading_rate_increments[k], scenario.heading_phases, **options)
+        engines = [batch[k]]
+        if k < singles:
+            engines.append(scenario.generate(initial_speed[k], final_speed[k],
+                heading_rate_increments[k]).columns.T)
+        for path, engine in enumerate(engines):
+            for field in range(len(TRAJECTORY_FIELDS)):
+                deviation, ratio = compare(engine[:, field], reference[:, field])
+                worst[path, field] = max(worst[path, field], deviation)
+                worst_ratio = max(worst_ratio, ratio)
+    return worst, worst_ratio
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Check the trajectory engine against the reference loop.")
+    parser.add_argument('--count', type=int, default=1200, help="parameter sets per scenario")
+    parser.add_argument('--singles', type=int, default=200,
+        help="of those, how many are also generated one at a time")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(args)
+
+    rng = np.random.default_rng(args.seed)
+    failed = False
+    for name in sorted(scenarios):
+        scenario = scenarios[name]
+        # closed-form paths have no per-point loop to compare with
+        if scenario.path is not None:
+            continue
+        worst, ratio = check_scenario(scenario, args.count, args.singles, rng)
+        status = 'ok'
+        if ratio > 1.0:
+            status = 'drifted'
+            failed = True
+        print("{:<40} batch {:.1e}  single {:.1e}  {:8.2g}x tolerance  {}".format(name,
+            worst[0].max(), worst[1].max(), ratio, status))
+        if ratio > 1.0:
+            for field, batch, single in zip(TRAJECTORY_FIELDS, *worst):
+                print("    {:<28} batch {:.1e}  single {:.1e}".format(field, batch, single))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
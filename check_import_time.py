@@ -0,0 +1,59 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures how long a fresh interpreter takes to import the plotting-free modules and
+# fails if that exceeds the budget or if any GUI module gets pulled in along the way.
+# Batch jobs and pool workers import these modules, so they have to stay light.
+
+MODULES = ('trajectory_core', 'sweep_runner', 'trajectory_planner')
+FORBIDDEN_MODULES = ('matplotlib', 'tkinter')
+IMPORT_TIME_BUDGET_S = 0.25
+
+# the probes import the modules from this directory, wherever the check is run from
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = '''
+import sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+print(elapsed, ",".join(loaded))
+'''
+
+# returns (median import seconds, forbidden modules that got imported)
+def measure_import(module, repeat=5):
+    timings = []
+    loaded = ''
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c',
+            _PROBE.format(module=module, forbidden=FORBIDDEN_MODULES)],
+            cwd=MODULE_DIR, check=True, capture_output=True, text=True).stdout.split()
+        timings.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ''
+    return statistics.median(timings), [m for m in loaded.split(',') if m]
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Check the import-time budget of the headless modules.")
+    parser.add_argument('--budget', type=float, default=IMPORT_TIME_BUDGET_S, help="seconds per module")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(args)
+
+    failed = False
+    for module in MODULES:
+        seconds, loaded = measure_import(module, args.repeat)
+        status = 'ok'
+        if seconds > args.budget:
+            status = 'over budget'
+            failed = True
+        if loaded:
+            status = 'imports ' + ', '.join(loaded)
+            failed = True
+        print("{:<20} {:7.1f}ms  {}".format(module, seconds * 1000, status))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from path_index import PathIndex
+from trajectory_core import as_columns, get_scenario, parameter_grid
+
+# Collision checks of the vehicle's footprint along generated trajectories.
+#
+# The footprint is an oriented rectangle at every point, aligned with the direction of
+# travel from the x/y steps (heading_rad is not the heading in radians, see
+# trajectory_core.TRAJECTORY_FIELDS). It is checked against two kinds of static environment:
+#   obstacles       convex polygons, as (k, 2) vertex arrays; split concave ones
+#   OccupancyGrid   occupied cells, e.g. a rasterized map or the outside of a drivable
+#                   corridor (OccupancyGrid.from_corridor)
+#
+# Everything works on column arrays of shape (..., fields, num_points), so a whole sweep is
+# screened at once, and most poses are discarded by cheap broad phases before the exact
+# test:
+#   polygons  trajectory bounding boxes against obstacle bounding boxes, then each pose's
+#             bounding circle against them, then a separating axis test of rectangle and
+#             polygon
+#   grid      occupied cells under each pose's bounding box, counted in O(1) from an
+#             integral image, then the same for blocks of the footprint a few cells across,
+#             and only the blocks that may overlap are sampled at half the grid resolution
+# A cell overlapped by the footprint in a sliver narrower than the sample spacing can be
+# missed; inflate() the grid by a cell for a conservative check. The area outside the grid
+# counts as free.
+
+class VehicleFootprint:
+    # the trajectory point is rear_overhang metres ahead of the rear bumper, on the centre line
+    def __init__(self, length=4.8, width=1.9, rear_overhang=1.0):
+        self.length = length
+        self.width = width
+        self.rear_overhang = rear_overhang
+
+    # offset of the rectangle's centre ahead of the trajectory point
+    @property
+    def center_offset(self):
+        return 0.5 * self.length - self.rear_overhang
+
+    # radius of the circle around the centre that contains the rectangle
+    @property
+    def radius(self):
+        return 0.5 * math.hypot(self.length, self.width)
+
+    # corners (4, 2) around the centre, counter-clockwise from rear right
+    def corners(self):
+        half_length, half_width = 0.5 * self.length, 0.5 * self.width
+        return np.array([[-half_length, -half_width], [half_length, -half_width],
+            [half_length, half_width], [-half_length, half_width]])
+
+    def __repr__(self):
+        return "VehicleFootprint(length=%r, width=%r, rear_overhang=%r)" % (self.length,
+            self.width, self.rear_overhang)
+
+# convex polygon of a length x width rectangle centred on (x, y), rotated by heading
+def rectangle_obstacle(x, y, length, width, heading=0.0):
+    cos, sin = math.cos(heading), math.sin(heading)
+    corners = VehicleFootprint(length, width, 0.5 * length).corners()
+    return np.column_stack([x + cos * corners[:, 0] - sin * corners[:, 1],
+        y + sin * corners[:, 0] + cos * corners[:, 1]])
+
+# Footprint centres (n, num_points, 2) and direction cos / sin (n, num_points) of columns
+# shaped (n, fields, num_points). Each point faces along the step leaving it, the last one
+# along the step reaching it; points that do not move keep the last direction.
+def footprint_poses(columns, footprint):
+    dx = np.diff(columns[:, 1], axis=-1)
+    dy = np.diff(columns[:, 2], axis=-1)
+    dx = np.concatenate([dx, dx[:, -1:]], axis=-1) if dx.shape[-1] else np.ones_like(columns[:, 1])
+    dy = np.concatenate([dy, dy[:, -1:]], axis=-1) if dy.shape[-1] else np.zeros_like(columns[:, 2])
+    moving = np.hypot(dx, dy) > 0
+    last = np.maximum.accumulate(np.where(moving, np.arange(dx.shape[-1]), 0), axis=-1)
+    rows = np.arange(dx.shape[0])[:, None]
+    heading = np.where(moving[rows, last], np.arctan2(dy[rows, last], dx[rows, last]), 0.0)
+    cos, sin = np.cos(heading), np.sin(heading)
+    centers = np.stack([columns[:, 1] + footprint.center_offset * cos,
+        columns[:, 2] + footprint.center_offset * sin], axis=-1)
+    return centers, cos, sin
+
+# world coordinates (..., k, 2) of local footprint points (k, 2) at the given poses
+def _place(local, centers, cos, sin):
+    x = centers[..., None, 0] + cos[..., None] * local[:, 0] - sin[..., None] * local[:, 1]
+    y = centers[..., None, 1] + sin[..., None] * local[:, 0] + cos[..., None] * local[:, 1]
+    return np.stack([x, y], axis=-1)
+
+# Centres (b, 2) of the blocks, at most block_size on a side, that tile the footprint,
+# their half size (length, width), and a lattice (k, 2) of points at most spacing apart
+# covering a block around its centre, edges included
+def _blocks(footprint, block_size, spacing):
+    axes, half_size = [], []
+    for size in (footprint.length, footprint.width):
+        count = max(int(math.ceil(size / block_size)), 1)
+        half = 0.5 * size / count
+        axes.append(np.linspace(-0.5 * size + half, 0.5 * size - half, count))
+        half_size.append(half)
+        axes.append(np.linspace(-half, half, int(math.ceil(2 * half / spacing)) + 1))
+    centers = np.stack([g.ravel() for g in np.meshgrid(axes[0], axes[2])], axis=-1)
+    lattice = np.stack([g.ravel() for g in np.meshgrid(axes[1], axes[3])], axis=-1)
+    return centers, half_size, lattice
+
+# separating axis test of rectangles (t, 4, 2) facing (cos, sin) against convex polygons
+# (t, k, 2); polygons padded by repeating a vertex add zero axes, which never separate
+def _overlap(corners, cos, sin, polygons):
+    edges = np.roll(polygons, -1, axis=1) - polygons
+    axes = np.concatenate([np.stack([np.stack([cos, sin], -1), np.stack([-sin, cos], -1)], 1),
+        np.stack([-edges[..., 1], edges[..., 0]], -1)], axis=1)
+    rectangle = np.einsum('tac,tvc->tav', axes, corners)
+    polygon = np.einsum('tac,tvc->tav', axes, polygons)
+    separated = ((rectangle.max(-1) < polygon.min(-1)) | (polygon.max(-1) < rectangle.min(-1)))
+    return ~separated.any(axis=-1)
+
+# (n, num_points) index of the lowest obstacle each pose overlaps, -1 where none
+def _polygon_hits(centers, cos, sin, footprint, obstacles, chunk):
+    n, num_points = cos.shape
+    hits = np.full((n, num_points), -1)
+    if not obstacles or n == 0 or num_points == 0:
+        return hits
+    size = max(len(p) for p in obstacles)
+    polygons = np.array([np.concatenate([p, np.repeat(p[-1:], size - len(p), axis=0)])
+        for p in (np.asarray(p, dtype=np.float64) for p in obstacles)])
+    low, high = polygons.min(axis=1), polygons.max(axis=1)
+    radius = footprint.radius
+    local = footprint.corners()
+
+    reach_low = centers.min(axis=1) - radius
+    reach_high = centers.max(axis=1) + radius
+    pair_n, pair_m = np.nonzero(np.all((reach_low[:, None] <= high[None])
+        & (reach_high[:, None] >= low[None]), axis=-1))
+    lowest = np.full((n, num_points), len(obstacles))
+    step = max(chunk // num_points, 1)
+    for start in range(0, len(pair_n), step):
+        pn, pm = pair_n[start:start + step], pair_m[start:start + step]
+        near = np.all((centers[pn] + radius >= low[pm, None])
+            & (centers[pn] - radius <= high[pm, None]), axis=-1)
+        q, p = np.nonzero(near)
+        tn, tm = pn[q], pm[q]
+        if len(tn) == 0:
+            continue
+        corners = _place(local, centers[tn, p], cos[tn, p], sin[tn, p])
+        hit = _overlap(corners, cos[tn, p], sin[tn, p], polygons[tm])
+        np.minimum.at(lowest, (tn[hit], p[hit]), tm[hit])
+    hits[lowest < len(obstacles)] = lowest[lowest < len(obstacles)]
+    return hits
+
+# Occupied cells of a regular grid: occupied[row, col] covers x from origin_x + col *
+# resolution and y from origin_y + row * resolution, one resolution wide.
+class OccupancyGrid:
+    def __init__(self, occupied, resolution, origin=(0.0, 0.0)):
+        self.occupied = np.asarray(occupied, dtype=bool)
+        if self.occupied.ndim != 2:
+            raise ValueError("expected a 2-d occupancy array, got shape %s"
+                % (self.occupied.shape,))
+        self.resolution = float(resolution)
+        self.origin = (float(origin[0]), float(origin[1]))
+        rows, cols = self.occupied.shape
+        self._integral = np.zeros((rows + 1, cols + 1), dtype=np.int64)
+        np.cumsum(np.cumsum(self.occupied, axis=0), axis=1, out=self._integral[1:, 1:])
+
+    # Grid around reference (a Trajectory) whose cells are occupied unless their centre lies
+    # within left_width of the path on its left and right_width on its right, measured
+    # across the closest segment, so the corridor runs straight on past the ends of the path
+    # to the edge of the grid. margin extends the grid beyond the path.
+    @classmethod
+    def from_corridor(cls, reference, left_width, right_width, resolution, margin=None):
+        index = PathIndex(reference)
+        if margin is None:
+            margin = max(left_width, right_width) + resolution
+        x0, y0 = index.x.min() - margin, index.y.min() - margin
+        cols = int(math.ceil((index.x.max() + margin - x0) / resolution))
+        rows = int(math.ceil((index.y.max() + margin - y0) / resolution))
+        cx = x0 + (np.arange(cols) + 0.5) * resolution
+        cy = y0 + (np.arange(rows) + 0.5) * resolution
+        qx, qy = np.meshgrid(cx, cy)
+        projection = index.project(qx, qy)
+        offset = ((qy - projection.y) * np.cos(projection.heading)
+            - (qx - projection.x) * np.sin(projection.heading))
+        inside = (offset <= left_width) & (offset >= -right_width)
+        return cls(~inside, resolution, (x0, y0))
+
+    # copy with every occupied cell grown by cells in each direction
+    def inflate(self, cells=1):
+        padded = np.pad(self.occupied, cells)
+        rows, cols = self.occupied.shape
+        grown = np.zeros_like(self.occupied)
+        for dr in range(2 * cells + 1):
+            for dc in range(2 * cells + 1):
+                grown |= padded[dr:dr + rows, dc:dc + cols]
+        return OccupancyGrid(grown, self.resolution, self.origin)
+
+    def _cells(self, x, y):
+        return (np.floor((y - self.origin[1]) / self.resolution).astype(np.int64),
+            np.floor((x - self.origin[0]) / self.resolution).astype(np.int64))
+
+    # number of occupied cells overlapping the axis-aligned boxes
+    def count(self, x0, y0, x1, y1):
+        rows, cols = self.occupied.shape
+        r0, c0 = self._cells(x0, y0)
+        r1, c1 = self._cells(x1, y1)
+        r0, r1 = np.clip(r0, 0, rows), np.clip(r1 + 1, 0, rows)
+        c0, c1 = np.clip(c0, 0, cols), np.clip(c1 + 1, 0, cols)
+        s = self._integral
+        return np.where((r1 > r0) & (c1 > c0), s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0], 0)
+
+    # occupancy at points; outside the grid is free
+    def occupied_at(self, x, y):
+        rows, cols = self.occupied.shape
+        r, c = self._cells(x, y)
+        valid = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+        return valid & self.occupied[np.clip(r, 0, rows - 1), np.clip(c, 0, cols - 1)]
+
+    # (n, num_points) bool: footprint overlaps an occupied cell. The footprint is split into
+    # blocks about four cells across; only blocks whose bounding box covers an occupied cell
+    # are sampled.
+    def hits(self, centers, cos, sin, footprint, chunk=1 << 20):
+        corners = _place(footprint.corners(), centers, cos, sin)
+        low, high = corners.min(axis=-2), corners.max(axis=-2)
+        hits = np.zeros(cos.shape, dtype=bool)
+        n, p = np.nonzero(self.count(low[..., 0], low[..., 1], high[..., 0], high[..., 1]) > 0)
+        if len(n) == 0:
+            return hits
+
+        blocks, half_size, lattice = _blocks(footprint, 4 * self.resolution,
+            0.5 * self.resolution)
+        step = max(chunk // len(blocks), 1)
+        for start in range(0, len(n), step):
+            tn, tp = n[start:start + step], p[start:start + step]
+            c, s = cos[tn, tp], sin[tn, tp]
+            middle = _place(blocks, centers[tn, tp], c, s)
+            # a block centre on an occupied cell settles the pose without sampling
+            hit = self.occupied_at(middle[..., 0], middle[..., 1]).any(axis=-1)
+            extent_x = (np.abs(c) * half_size[0] + np.abs(s) * half_size[1])[:, None]
+            extent_y = (np.abs(s) * half_size[0] + np.abs(c) * half_size[1])[:, None]
+            t, b = np.nonzero((self.count(middle[..., 0] - extent_x, middle[..., 1] - extent_y,
+                middle[..., 0] + extent_x, middle[..., 1] + extent_y) > 0) & ~hit[:, None])
+            pairs = max(chunk // len(lattice), 1)
+            for first in range(0, len(t), pairs):
+                tt, bb = t[first:first + pairs], b[first:first + pairs]
+                x = (middle[tt, bb, 0, None] + c[tt, None] * lattice[:, 0]
+                    - s[tt, None] * lattice[:, 1])
+                y = (middle[tt, bb, 1, None] + s[tt, None] * lattice[:, 0]
+                    + c[tt, None] * lattice[:, 1])
+                hit[tt[self.occupied_at(x, y).any(axis=-1)]] = True
+            hits[tn, tp] = hit
+        return hits
+
+    def __repr__(self):
+        return "OccupancyGrid(shape=%r, resolution=%r, origin=%r)" % (self.occupied.shape,
+            self.resolution, self.origin)
+
+class CollisionReport:
+    def __init__(self, obstacle, grid_hit):
+        self.obstacle = obstacle
+        self.grid_hit = grid_hit
+
+    # (..., num_points) bool: the footprint hits something at the point
+    @property
+    def collision(self):
+        return (self.obstacle >= 0) | self.grid_hit
+
+    # (...) bool: no collision anywhere along the trajectory
+    @property
+    def free(self):
+        return ~self.collision.any(axis=-1)
+
+    # index of the first colliding point, -1 where there is none
+    def first_collision(self):
+        collision = self.collision
+        return np.where(collision.any(axis=-1), collision.argmax(axis=-1), -1)
+
+    def __str__(self):
+        if np.ndim(self.free) == 0:
+            if self.free:
+                return "collision free"
+            first = self.first_collision()
+            what = ("obstacle %d" % self.obstacle[first] if self.obstacle[first] >= 0
+                else "occupied cell")
+            return "collision at point {} with {}".format(first, what)
+        return "{} of {} collision free".format(np.count_nonzero(self.free), self.free.size)
+
+# trajectories: a Trajectory or columns shaped (..., fields, num_points)
+def check(trajectories, obstacles=(), grid=None, footprint=None, chunk=1 << 18):
+    if footprint is None:
+        footprint = VehicleFootprint()
+    columns = as_columns(trajectories)
+    shape = columns.shape[:-2] + columns.shape[-1:]
+    columns = columns.reshape((-1,) + columns.shape[-2:])
+    centers, cos, sin = footprint_poses(columns, footprint)
+    obstacle = _polygon_hits(centers, cos, sin, footprint, list(obstacles), chunk)
+    grid_hit = np.zeros(cos.shape, dtype=bool)
+    if grid is not None:
+        grid_hit = grid.hits(centers, cos, sin, footprint)
+    return CollisionReport(obstacle.reshape(shape), grid_hit.reshape(shape))
+
+# batch: (n, num_points, fields) as returned by generate_trajectory_batch()
+def check_batch(batch, obstacles=(), grid=None, footprint=None):
+    return check(np.asarray(batch).swapaxes(-1, -2), obstacles, grid, footprint)
+
+# (n,) bool mask of the collision-free trajectories of a batch, for filtering sweeps
+def collision_free_mask(batch, obstacles=(), grid=None, footprint=None):
+    return check_batch(batch, obstacles, grid, footprint).free
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Screen a scenario sweep for collisions.")
+    parser.add_argument('scenario')
+    parser.add_argument('--sweep', type=int, default=10,
+        help="values per parameter of the sweep over the slider ranges")
+    parser.add_argument('--obstacle', nargs='+', type=float, action='append', default=[],
+        metavar='X Y LENGTH WIDTH [HEADING_DEG]', help="rectangular obstacle, repeatable")
+    parser.add_argument('--corridor', nargs=2, type=float, metavar=('LEFT', 'RIGHT'),
+        help="keep within these widths left / right of the scenario's default path")
+    parser.add_argument('--resolution', type=float, default=0.2,
+        help="cell size of the corridor grid in metres")
+    args = parser.parse_args(args)
+
+    scenario = get_scenario(args.scenario)
+    obstacles = []
+    for values in args.obstacle:
+        if len(values) not in (4, 5):
+            parser.error("--obstacle takes X Y LENGTH WIDTH [HEADING_DEG]")
+        heading = math.radians(values[4]) if len(values) == 5 else 0.0
+        obstacles.append(rectangle_obstacle(*values[:4], heading=heading))
+    grid = None
+    if args.corridor is not None:
+        grid = OccupancyGrid.from_corridor(scenario.generate(), args.corridor[0],
+            args.corridor[1], args.resolution)
+
+    grid_params = parameter_grid(np.linspace(*scenario.initial_speed_range, args.sweep),
+        np.linspace(*scenario.final_speed_range, args.sweep),
+        np.linspace(*scenario.heading_rate_increments_range, args.sweep))
+    batch = scenario.generate_batch(*grid_params)
+    started = time.perf_counter()
+    report = check_batch(batch, obstacles, grid)
+    elapsed = time.perf_counter() - started
+    print("{}: {} ({:.3f}s, {:,.0f} trajectories/s)".format(scenario.name, report,
+        elapsed, len(batch) / elapsed))
+    return report
+
+if __name__ == '__main__':
+    main()
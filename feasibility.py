@@ -0,0 +1,142 @@
+import numpy as np
+
+from trajectory_core import as_columns
+
+# Kinematic feasibility checks of generated trajectories against vehicle limits.
+#
+# The quantities are derived from the geometry and the time / velocity columns, not from
+# the acceleration_mps2 and heading_rate_rps columns: those divide by the cumulative
+# time_from_start instead of each step's duration, and heading_rate_rps divides a heading
+# that was integrated as radians but is exported as degrees. Here everything is per step:
+#   curvature                  change of the path direction per metre (1/m, + left)
+#   yaw_rate                   speed * curvature (rad/s)
+#   lateral_acceleration       speed^2 * curvature (m/s^2)
+#   longitudinal_acceleration  speed change over the step's duration (m/s^2)
+#   jerk                       longitudinal acceleration change over the step's duration
+# Steps that take no time (standing still) have no acceleration or jerk and are skipped.
+#
+# The generated speed profiles switch from accelerating to braking within one step, so
+# their jerk is a spike at the switch by construction. Jerk is therefore reported but only
+# checked when max_jerk is set, e.g. for trajectories from other sources.
+#
+# Everything works on column arrays of shape (..., fields, num_points), so a whole sweep
+# is checked with a handful of array operations.
+
+class VehicleLimits:
+    def __init__(self, max_speed=35.0, max_acceleration=3.0, max_deceleration=6.0,
+            max_jerk=None, max_curvature=0.2, max_lateral_acceleration=4.0, max_yaw_rate=1.0):
+        self.max_speed = max_speed
+        self.max_acceleration = max_acceleration
+        self.max_deceleration = max_deceleration
+        self.max_jerk = max_jerk
+        self.max_curvature = max_curvature
+        self.max_lateral_acceleration = max_lateral_acceleration
+        self.max_yaw_rate = max_yaw_rate
+
+    def __repr__(self):
+        return "VehicleLimits(%s)" % ", ".join("%s=%r" % item for item in vars(self).items())
+
+CHECKS = ('speed', 'longitudinal_acceleration', 'jerk', 'curvature', 'lateral_acceleration',
+    'yaw_rate')
+
+# per-point kinematic quantities of columns shaped (..., fields, num_points), each returned
+# as a (..., num_points) array; NaN where a quantity is undefined
+def kinematics(trajectories):
+    columns = as_columns(trajectories)
+    time = columns[..., 0, :]
+    speed = columns[..., 4, :]
+    dx = np.diff(columns[..., 1, :], axis=-1)
+    dy = np.diff(columns[..., 2, :], axis=-1)
+    step = np.hypot(dx, dy)
+    dt = np.diff(time, axis=-1)
+    shape = time.shape
+
+    # turning angle between consecutive steps, from their cross and dot products
+    curvature = np.zeros(shape)
+    turn = np.arctan2(dx[..., :-1] * dy[..., 1:] - dy[..., :-1] * dx[..., 1:],
+        dx[..., :-1] * dx[..., 1:] + dy[..., :-1] * dy[..., 1:])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_step = 0.5 * (step[..., 1:] + step[..., :-1])
+        curvature[..., 1:-1] = np.where(mean_step > 0, turn / mean_step, 0.0)
+
+        acceleration = np.full(shape, np.nan)
+        acceleration[..., 0] = 0.0
+        acceleration[..., 1:] = np.where(dt > 0, np.diff(speed, axis=-1) / dt, np.nan)
+        jerk = np.full(shape, np.nan)
+        jerk[..., :2] = 0.0
+        jerk[..., 2:] = np.where(dt[..., 1:] > 0,
+            np.diff(acceleration[..., 1:], axis=-1) / dt[..., 1:], np.nan)
+    return {'speed': speed, 'longitudinal_acceleration': acceleration, 'jerk': jerk,
+        'curvature': curvature, 'lateral_acceleration': speed * speed * curvature,
+        'yaw_rate': speed * curvature}
+
+# violation mask per check, shaped like the quantities
+def _violations(quantities, limits):
+    with np.errstate(invalid='ignore'):
+        acceleration = quantities['longitudinal_acceleration']
+        return {
+            'speed': quantities['speed'] > limits.max_speed,
+            'longitudinal_acceleration': (acceleration > limits.max_acceleration)
+                | (acceleration < -limits.max_deceleration),
+            'jerk': np.zeros(quantities['jerk'].shape, dtype=bool) if limits.max_jerk is None
+                else np.abs(quantities['jerk']) > limits.max_jerk,
+            'curvature': np.abs(quantities['curvature']) > limits.max_curvature,
+            'lateral_acceleration':
+                np.abs(quantities['lateral_acceleration']) > limits.max_lateral_acceleration,
+            'yaw_rate': np.abs(quantities['yaw_rate']) > limits.max_yaw_rate,
+        }
+
+class FeasibilityReport:
+    def __init__(self, quantities, violations, limits):
+        self.quantities = quantities
+        self.violations = violations
+        self.limits = limits
+
+    # (...) bool: no violation anywhere along the trajectory
+    @property
+    def feasible(self):
+        return ~np.any([mask.any(axis=-1) for mask in self.violations.values()], axis=0)
+
+    # number of violating points per check, each (...)
+    def violation_counts(self):
+        return {name: mask.sum(axis=-1) for name, mask in self.violations.items()}
+
+    # largest magnitude per check, each (...)
+    def peaks(self):
+        return {name: np.fmax.reduce(np.abs(values), axis=-1)
+            for name, values in self.quantities.items()}
+
+    # index of the first violating point per check, -1 where there is none
+    def first_violation(self):
+        return {name: np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+            for name, mask in self.violations.items()}
+
+    def __str__(self):
+        counts = self.violation_counts()
+        peaks = self.peaks()
+        if np.ndim(self.feasible) == 0:
+            lines = ["feasible" if self.feasible else "infeasible"]
+            for name in CHECKS:
+                lines.append("  {:<26} peak {:10.4f}  violations {}".format(name, peaks[name],
+                    counts[name]))
+            return "\n".join(lines)
+        lines = ["{} of {} feasible".format(np.count_nonzero(self.feasible), self.feasible.size)]
+        for name in CHECKS:
+            lines.append("  {:<26} violated by {}".format(name,
+                np.count_nonzero(counts[name])))
+        return "\n".join(lines)
+
+# trajectories: a Trajectory or columns shaped (..., fields, num_points)
+def validate(trajectories, limits=None):
+    if limits is None:
+        limits = VehicleLimits()
+    quantities = kinematics(trajectories)
+    return FeasibilityReport(quantities, _violations(quantities, limits), limits)
+
+# batch: (n, num_points, fields) as returned by generate_trajectory_batch()
+def validate_batch(batch, limits=None):
+    return validate(np.asarray(batch).swapaxes(-1, -2), limits)
+
+# (n,) bool mask of the feasible trajectories of a batch, for filtering sweeps
+def feasible_mask(batch, limits=None):
+    return validate_batch(batch, limits).feasible
@@ -0,0 +1,183 @@
+import functools
+import json
+import math
+import os
+import sys
+import threading
+from time import perf_counter
+
+# Opt-in timing of the hot paths: generation phases, export and the tuner's callbacks.
+#
+# Instrumented code calls start() / stop(name, started) around a section, or is wrapped
+# with @instrument(name). While disabled, start() returns None and stop() returns at once,
+# so the cost is one function call and a flag check per section. Enabled, every stop()
+# records the latency into a per-name histogram with log-spaced buckets (four per decade
+# from 1us to 100s); count() keeps plain counters.
+#
+# Enable it with enable() or from the environment without touching any code:
+#   TRAJECTORY_INSTRUMENTATION=1          record from import on
+#   TRAJECTORY_INSTRUMENTATION_DUMP=10    also print a report to stderr every 10s
+#   TRAJECTORY_INSTRUMENTATION_PATH=f     write the periodic dump to f as JSON instead
+
+enabled = False
+
+BUCKETS_PER_DECADE = 4
+MIN_LATENCY_S = 1e-6
+NUM_BUCKETS = 8 * BUCKETS_PER_DECADE + 2 # below 1us, 1us..100s, above 100s
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_dump_thread = None
+_dump_stop = None
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds < MIN_LATENCY_S:
+            bucket = 0
+        else:
+            bucket = min(int(math.log10(seconds / MIN_LATENCY_S) * BUCKETS_PER_DECADE) + 1,
+                NUM_BUCKETS - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    # upper edge of bucket i in seconds
+    @staticmethod
+    def bucket_bound(i):
+        if i >= NUM_BUCKETS - 1:
+            return math.inf
+        return MIN_LATENCY_S * 10 ** (i / BUCKETS_PER_DECADE)
+
+    # approximate quantile (0..1): the upper edge of the bucket it falls into, capped at max
+    def quantile(self, q):
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bucket_bound(i), self.max)
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'total_s': self.total,
+            'mean_s': self.total / self.count if self.count else math.nan,
+            'min_s': self.min if self.count else math.nan, 'max_s': self.max,
+            'p50_s': self.quantile(0.5), 'p90_s': self.quantile(0.9), 'p99_s': self.quantile(0.99),
+            'buckets': list(self.buckets)}
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def start():
+    if not enabled:
+        return None
+    return perf_counter()
+
+# records the time since started (as returned by start()) under name
+def stop(name, started):
+    if started is None:
+        return
+    elapsed = perf_counter() - started
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = LatencyHistogram()
+        histogram.record(elapsed)
+
+def count(name, n=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+# decorator timing every call of the function under name
+def instrument(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(name, started)
+        return wrapper
+    return decorate
+
+# {'latency': {name: histogram summary}, 'counters': {name: value}}
+def snapshot():
+    with _lock:
+        return {'latency': {name: h.summary() for name, h in _histograms.items()},
+            'counters': dict(_counters)}
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def report():
+    stats = snapshot()
+    lines = ["{:<36} {:>8} {:>10} {:>10} {:>10} {:>10}".format('section', 'calls', 'mean ms',
+        'p50 ms', 'p99 ms', 'max ms')]
+    for name in sorted(stats['latency']):
+        s = stats['latency'][name]
+        lines.append("{:<36} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(name,
+            s['count'], s['mean_s'] * 1e3, s['p50_s'] * 1e3, s['p99_s'] * 1e3, s['max_s'] * 1e3))
+    for name in sorted(stats['counters']):
+        lines.append("{:<36} {:>8}".format(name, stats['counters'][name]))
+    return "\n".join(lines)
+
+def _dump(path):
+    if path is None:
+        print(report(), file=sys.stderr)
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+# Dumps the statistics every interval_s seconds from a daemon thread: a report to stderr,
+# or a JSON snapshot to path (replaced atomically). Replaces a dump already running.
+def start_periodic_dump(interval_s, path=None):
+    global _dump_thread, _dump_stop
+    stop_periodic_dump()
+    _dump_stop = threading.Event()
+
+    def run(stop_event):
+        while not stop_event.wait(interval_s):
+            _dump(path)
+    _dump_thread = threading.Thread(target=run, args=(_dump_stop,), daemon=True,
+        name="instrumentation-dump")
+    _dump_thread.start()
+
+def stop_periodic_dump():
+    global _dump_thread, _dump_stop
+    if _dump_thread is None:
+        return
+    _dump_stop.set()
+    _dump_thread.join()
+    _dump_thread = _dump_stop = None
+
+if os.environ.get('TRAJECTORY_INSTRUMENTATION', '') not in ('', '0'):
+    enable()
+    if os.environ.get('TRAJECTORY_INSTRUMENTATION_DUMP'):
+        start_periodic_dump(float(os.environ['TRAJECTORY_INSTRUMENTATION_DUMP']),
+            os.environ.get('TRAJECTORY_INSTRUMENTATION_PATH'))
@@ -0,0 +1,171 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from feasibility import VehicleLimits, feasible_mask
+from trajectory_core import Scenario, get_scenario
+
+# Searches a scenario's parameters (initial_speed, final_speed, heading_rate_increments) for
+# a target end pose instead of tuning them with the sliders.
+#
+# The cost is the squared distance of the end point to (target_x, target_y) plus
+# heading_weight times the squared heading error, for whichever targets are given. The end
+# heading is the direction of the last step, the direction the points actually advance in.
+# With limits (a feasibility.VehicleLimits), infeasible candidates cost an extra
+# INFEASIBLE_PENALTY so the search settles on a feasible one whenever there is one.
+#
+# The search evaluates a grid over the parameter bounds as one batch, shrinks the bounds
+# around the best candidate and repeats. If scipy is installed, the result is then polished
+# with scipy.optimize.minimize (Nelder-Mead). Every evaluated parameter set is cached, so
+# refinement and polishing never regenerate a candidate they have already seen.
+
+PARAMETERS = ('initial_speed', 'final_speed', 'heading_rate_increments')
+INFEASIBLE_PENALTY = 1e6
+
+class SearchResult:
+    def __init__(self, scenario, params, cost, end_pose, feasible, evaluations, seconds):
+        self.scenario = scenario
+        self.params = params
+        self.cost = cost
+        self.end_pose = end_pose
+        self.feasible = feasible
+        self.evaluations = evaluations
+        self.seconds = seconds
+
+    def trajectory(self):
+        return self.scenario.generate(**self.params)
+
+    def __str__(self):
+        return "{}: {} -> end pose ({:.3f}, {:.3f}, {:.4f}rad), cost {:.3g}{}, {} evaluations in {:.3f}s".format(
+            self.scenario.name, ", ".join("{}={:.6g}".format(k, v) for k, v in self.params.items()),
+            *self.end_pose, self.cost, "" if self.feasible else " (infeasible)", self.evaluations,
+            self.seconds)
+
+class ParameterSearch:
+    # bounds: {parameter: (low, high)} of the parameters to search, by default the
+    # scenario's heading rate slider range; the others keep the scenario's values unless
+    # given in fixed
+    def __init__(self, scenario, target_x=None, target_y=None, target_heading=None,
+            bounds=None, fixed=None, heading_weight=100.0, limits=None):
+        if not isinstance(scenario, Scenario):
+            scenario = get_scenario(scenario)
+        if target_x is None and target_y is None and target_heading is None:
+            raise ValueError("no target given")
+        if bounds is None:
+            bounds = {'heading_rate_increments': scenario.heading_rate_increments_range}
+        for name in list(bounds) + list(fixed or ()):
+            if name not in PARAMETERS:
+                raise ValueError("unknown parameter %r, expected one of: %s"
+                    % (name, ", ".join(PARAMETERS)))
+        self.scenario = scenario
+        self.target = (target_x, target_y, target_heading)
+        self.names = tuple(bounds)
+        self.bounds = np.array([bounds[name] for name in self.names], dtype=np.float64)
+        self.fixed = {name: getattr(scenario, name) for name in PARAMETERS}
+        self.fixed.update(fixed or {})
+        self.heading_weight = heading_weight
+        self.limits = limits
+        self._evaluations = {}
+
+    def _key(self, values):
+        return tuple(float('%.12g' % v) for v in values)
+
+    # costs of the (m, len(names)) candidates; only unseen ones are generated, as one batch
+    def evaluate(self, candidates):
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+        keys = [self._key(c) for c in candidates]
+        missing = sorted({key for key in keys if key not in self._evaluations})
+        if missing:
+            values = np.array(missing)
+            params = dict(self.fixed)
+            params.update(zip(self.names, values.T))
+            batch = self.scenario.generate_batch(params['initial_speed'], params['final_speed'],
+                params['heading_rate_increments'])
+            end = batch[:, -1, 1:3]
+            step = end - batch[:, -2, 1:3]
+            heading = np.arctan2(step[:, 1], step[:, 0])
+
+            cost = np.zeros(len(missing))
+            target_x, target_y, target_heading = self.target
+            if target_x is not None:
+                cost += (end[:, 0] - target_x) ** 2
+            if target_y is not None:
+                cost += (end[:, 1] - target_y) ** 2
+            if target_heading is not None:
+                error = (heading - target_heading + np.pi) % (2 * np.pi) - np.pi
+                cost += self.heading_weight * error ** 2
+            feasible = np.ones(len(missing), dtype=bool)
+            if self.limits is not None:
+                feasible = feasible_mask(batch, self.limits)
+                cost += np.where(feasible, 0.0, INFEASIBLE_PENALTY)
+            for i, key in enumerate(missing):
+                self._evaluations[key] = (cost[i], (end[i, 0], end[i, 1], heading[i]), feasible[i])
+        return np.array([self._evaluations[key][0] for key in keys])
+
+    @property
+    def evaluations(self):
+        return len(self._evaluations)
+
+    # points_per_dimension candidates along every searched parameter per round; each round
+    # shrinks the bounds to two grid steps around the best candidate
+    def solve(self, rounds=8, points_per_dimension=17, polish=True):
+        started = time.perf_counter()
+        low, high = self.bounds[:, 0].copy(), self.bounds[:, 1].copy()
+        best = None
+        for _ in range(rounds):
+            axes = [np.linspace(l, h, points_per_dimension) for l, h in zip(low, high)]
+            candidates = np.stack([g.ravel() for g in np.meshgrid(*axes, indexing='ij')], axis=1)
+            costs = self.evaluate(candidates)
+            best = candidates[np.argmin(costs)]
+            step = (high - low) / (points_per_dimension - 1)
+            low = np.maximum(best - 2 * step, self.bounds[:, 0])
+            high = np.minimum(best + 2 * step, self.bounds[:, 1])
+            if np.all(high - low <= 1e-12 * np.maximum(np.abs(best), 1.0)):
+                break
+
+        if polish:
+            best = self._polish(best)
+        cost, end_pose, feasible = self._evaluations[self._key(best)]
+        params = dict(zip(PARAMETERS, (self.fixed[name] for name in PARAMETERS)))
+        params.update((name, float(v)) for name, v in zip(self.names, best))
+        return SearchResult(self.scenario, params, float(cost), end_pose, bool(feasible),
+            self.evaluations, time.perf_counter() - started)
+
+    # local refinement with scipy when it is installed; the grid result otherwise
+    def _polish(self, start):
+        try:
+            from scipy.optimize import minimize
+        except ImportError:
+            return start
+        result = minimize(lambda v: self.evaluate(v)[0], start, method='Nelder-Mead',
+            bounds=self.bounds, options={'xatol': 1e-12, 'fatol': 1e-12, 'maxfev': 200})
+        if self.evaluate(result.x)[0] < self.evaluate(start)[0]:
+            return result.x
+        return start
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Search a scenario's parameters for a target end pose.")
+    parser.add_argument('scenario')
+    parser.add_argument('--x', type=float, help="target end x in metres")
+    parser.add_argument('--y', type=float, help="target end y in metres")
+    parser.add_argument('--heading', type=float, help="target end heading in degrees")
+    parser.add_argument('--search', nargs=3, action='append', metavar=('PARAMETER', 'LOW', 'HIGH'),
+        help="parameter bounds to search, repeatable; default: the heading rate slider range")
+    parser.add_argument('--feasible', action='store_true',
+        help="prefer candidates within the default vehicle limits")
+    args = parser.parse_args(args)
+
+    bounds = None
+    if args.search:
+        bounds = {name: (float(low), float(high)) for name, low, high in args.search}
+    search = ParameterSearch(args.scenario, args.x, args.y,
+        None if args.heading is None else math.radians(args.heading), bounds,
+        limits=VehicleLimits() if args.feasible else None)
+    result = search.solve()
+    print(result)
+    return result
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Spatial queries against the path of one trajectory: nearest point, projection onto the
+# path's segments and the point a given distance further along it.
+#
+# Segments (and points) are binned into a uniform grid. A query only looks at the 3x3
+# cells around it, which is exact whenever the closest element is within one cell size;
+# queries further away retry on grids with 4x larger cells, and only queries further from
+# the path than its whole extent fall back to checking every segment. Every step works on
+# all queries of a batch at once.
+#
+# With a hint (the segment or point index found for the previous pose) the search is a
+# warm start: it only checks the window of elements just ahead of the hint and falls back
+# to the grid when the closest one is at the far end of that window.
+#
+# Queries take scalars or equal-shaped arrays of x/y and return results of the same shape.
+# Headings are the direction of the path's segments, which is what a follower steers
+# along (heading_rad is not the heading in radians, see trajectory_core.TRAJECTORY_FIELDS).
+
+# index is the segment (from point index to index + 1) the pose projects onto, fraction
+# how far along it; lateral_offset is positive left of the path
+Projection = namedtuple('Projection', ['index', 'fraction', 'x', 'y', 'distance', 'arc_length',
+    'lateral_offset', 'heading'])
+
+# closest parameter on segments from (x0, y0) along (dx, dy), and the squared distance to it
+def _closest_on_segments(qx, qy, x0, y0, dx, dy, length2):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(length2 > 0, ((qx - x0) * dx + (qy - y0) * dy) / length2, 0.0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    ex = x0 + fraction * dx - qx
+    ey = y0 + fraction * dy - qy
+    return fraction, ex * ex + ey * ey
+
+# per owner, the position of its smallest distance (lowest element on ties); owners that
+# have no candidates get -1
+def _argmin_per_owner(owner, element, distance2, num_owners):
+    best = np.full(num_owners, -1)
+    if len(owner) == 0:
+        return best
+    order = np.lexsort((element, distance2, owner))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = owner[order[1:]] != owner[order[:-1]]
+    best[owner[order[first]]] = order[first]
+    return best
+
+# segments binned into square cells of cell_size; every segment is listed in each cell its
+# bounding box overlaps
+class _Grid:
+    def __init__(self, x0, y0, x1, y1, cell_size):
+        self.cell_size = cell_size
+        cx0 = np.floor(np.minimum(x0, x1) / cell_size).astype(np.int64)
+        cy0 = np.floor(np.minimum(y0, y1) / cell_size).astype(np.int64)
+        cx1 = np.floor(np.maximum(x0, x1) / cell_size).astype(np.int64)
+        cy1 = np.floor(np.maximum(y0, y1) / cell_size).astype(np.int64)
+        self.origin = (cx0.min(), cy0.min())
+        self.shape = (cx1.max() - self.origin[0] + 1, cy1.max() - self.origin[1] + 1)
+
+        width = cx1 - cx0 + 1
+        counts = width * (cy1 - cy0 + 1)
+        element = np.repeat(np.arange(len(x0)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = self._cell_key(cx0[element] + local % width[element],
+            cy0[element] + local // width[element])
+        order = np.argsort(cells, kind='stable')
+        self.keys, self.starts, counts = np.unique(cells[order], return_index=True,
+            return_counts=True)
+        self.ends = self.starts + counts
+        self.elements = element[order]
+
+    def _cell_key(self, cx, cy):
+        return (cx - self.origin[0]) * self.shape[1] + (cy - self.origin[1])
+
+    # (owner, element) pairs for every element listed in the 3x3 cells around each query
+    def candidates(self, qx, qy):
+        cx = np.floor(qx / self.cell_size).astype(np.int64)[:, None] + np.repeat([-1, 0, 1], 3)
+        cy = np.floor(qy / self.cell_size).astype(np.int64)[:, None] + np.tile([-1, 0, 1], 3)
+        inside = ((cx >= self.origin[0]) & (cx < self.origin[0] + self.shape[0])
+            & (cy >= self.origin[1]) & (cy < self.origin[1] + self.shape[1]))
+        keys = np.where(inside, self._cell_key(cx, cy), -1).ravel()
+        position = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[position] == keys
+        starts = self.starts[position]
+        counts = np.where(found, self.ends[position] - starts, 0)
+
+        owner = np.repeat(np.arange(len(keys)) // 9, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, self.elements[np.repeat(starts, counts) + local]
+
+# closest elements of one kind (segments or single points) with grid levels built on demand
+class _ElementIndex:
+    def __init__(self, x0, y0, x1, y1, cell_size):
+        self.x0, self.y0 = x0, y0
+        self.dx, self.dy = x1 - x0, y1 - y0
+        self.length2 = self.dx * self.dx + self.dy * self.dy
+        self.cell_size = cell_size
+        self.extent = max(np.ptp(np.r_[x0, x1]), np.ptp(np.r_[y0, y1]), cell_size)
+        self._levels = []
+
+    def _grid(self, level):
+        while len(self._levels) <= level:
+            self._levels.append(_Grid(self.x0, self.y0, self.x0 + self.dx, self.y0 + self.dy,
+                self.cell_size * 4 ** len(self._levels)))
+        return self._levels[level]
+
+    def _distances(self, qx, qy, owner, element):
+        return _closest_on_segments(qx[owner], qy[owner], self.x0[element], self.y0[element],
+            self.dx[element], self.dy[element], self.length2[element])
+
+    # returns (element, fraction, squared distance) for 1-D query arrays
+    def closest(self, qx, qy, hint=None, window=32):
+        count = len(qx)
+        element = np.zeros(count, dtype=np.int64)
+        fraction = np.zeros(count)
+        distance2 = np.full(count, np.inf)
+        pending = np.arange(count)
+
+        if hint is not None:
+            last = len(self.x0) - 1
+            candidates = np.clip(np.broadcast_to(hint, (count,))[:, None]
+                + np.arange(-1, window), 0, last)
+            t, d2 = _closest_on_segments(qx[:, None], qy[:, None], self.x0[candidates],
+                self.y0[candidates], self.dx[candidates], self.dy[candidates],
+                self.length2[candidates])
+            best = np.argmin(d2, axis=1)
+            rows = np.arange(count)
+            element = candidates[rows, best]
+            fraction = t[rows, best]
+            distance2 = d2[rows, best]
+            # a minimum at either end of the window may continue past it
+            pending = np.flatnonzero(((best == window) & (element < last))
+                | ((best == 0) & (element > 0)))
+
+        level = 0
+        while len(pending):
+            grid = self._grid(level)
+            owner, candidate = grid.candidates(qx[pending], qy[pending])
+            t, d2 = self._distances(qx[pending], qy[pending], owner, candidate)
+            best = _argmin_per_owner(owner, candidate, d2, len(pending))
+            has = best >= 0
+            found = pending[has]
+            element[found] = candidate[best[has]]
+            fraction[found] = t[best[has]]
+            distance2[found] = d2[best[has]]
+            # exact when the closest element is within one cell
+            exact = np.zeros(len(pending), dtype=bool)
+            exact[has] = d2[best[has]] <= grid.cell_size * grid.cell_size
+            pending = pending[~exact]
+            if grid.cell_size >= self.extent:
+                break
+            level += 1
+
+        # far away from the whole path: compare against everything, a chunk at a time
+        for start in range(0, len(pending), 256):
+            chunk = pending[start:start + 256]
+            t, d2 = _closest_on_segments(qx[chunk, None], qy[chunk, None], self.x0, self.y0,
+                self.dx, self.dy, self.length2)
+            best = np.argmin(d2, axis=1)
+            rows = np.arange(len(chunk))
+            element[chunk] = best
+            fraction[chunk] = t[rows, best]
+            distance2[chunk] = d2[rows, best]
+        return element, fraction, distance2
+
+class PathIndex:
+    # cell_size defaults to four times the mean point spacing
+    def __init__(self, trajectory, cell_size=None):
+        x = np.array(trajectory.x, dtype=np.float64)
+        y = np.array(trajectory.y, dtype=np.float64)
+        if len(x) == 0:
+            raise ValueError("cannot index an empty trajectory")
+        if len(x) == 1:
+            x, y = np.repeat(x, 2), np.repeat(y, 2)
+        self.x, self.y = x, y
+        segment_length = np.hypot(np.diff(x), np.diff(y))
+        self.arc_length = np.zeros(len(x))
+        np.cumsum(segment_length, out=self.arc_length[1:])
+        self.segment_length = segment_length
+        self.segment_heading = np.arctan2(np.diff(y), np.diff(x))
+        if cell_size is None:
+            cell_size = 4 * segment_length.mean() if segment_length.mean() > 0 else 1.0
+        self.cell_size = cell_size
+        self._segments = _ElementIndex(x[:-1], y[:-1], x[1:], y[1:], cell_size)
+        self._points = None
+
+    def __len__(self):
+        return len(self.x)
+
+    # index of the closest trajectory point; hint is the previous result for a warm start
+    def nearest(self, x, y, hint=None, window=32):
+        if self._points is None:
+            self._points = _ElementIndex(self.x, self.y, self.x, self.y, self.cell_size)
+        qx, qy, shape = _queries(x, y)
+        index, _, _ = self._points.closest(qx, qy, _hint(hint, qx), window)
+        return _shaped(index, shape)
+
+    # projection onto the closest segment; hint is the previous Projection.index
+    def project(self, x, y, hint=None, window=32):
+        qx, qy, shape = _queries(x, y)
+        index, fraction, distance2 = self._segments.closest(qx, qy, _hint(hint, qx), window)
+        px = self.x[index] + fraction * (self.x[index + 1] - self.x[index])
+        py = self.y[index] + fraction * (self.y[index + 1] - self.y[index])
+        distance = np.sqrt(distance2)
+        cross = ((self.x[index + 1] - self.x[index]) * (qy - self.y[index])
+            - (self.y[index + 1] - self.y[index]) * (qx - self.x[index]))
+        return Projection(*(_shaped(a, shape) for a in (index, fraction, px, py, distance,
+            self.arc_length[index] + fraction * self.segment_length[index],
+            np.where(cross < 0, -distance, distance), self.segment_heading[index])))
+
+    # (x, y, heading) at the given arc lengths, held at the ends of the path
+    def point_at(self, arc_length):
+        arc_length = np.asarray(arc_length, dtype=np.float64)
+        segment = np.clip(np.searchsorted(self.arc_length, arc_length, side='right') - 1,
+            0, len(self.segment_length) - 1)
+        return (np.interp(arc_length, self.arc_length, self.x),
+            np.interp(arc_length, self.arc_length, self.y), self.segment_heading[segment])
+
+    # Returns (projection, (x, y, heading) of the point distance metres further along the
+    # path). distance may be an array matching the queries, e.g. speed-dependent lookahead.
+    def lookahead(self, x, y, distance, hint=None, window=32):
+        projection = self.project(x, y, hint, window)
+        return projection, self.point_at(projection.arc_length + distance)
+
+# Nearest-point queries over scattered points, e.g. the points of many trajectories at once.
+# cell_size defaults to twice the spacing the points would have spread evenly over their
+# bounding box.
+class PointIndex:
+    def __init__(self, x, y, cell_size=None):
+        self.x = np.array(x, dtype=np.float64).ravel()
+        self.y = np.array(y, dtype=np.float64).ravel()
+        if len(self.x) == 0:
+            raise ValueError("cannot index zero points")
+        if cell_size is None:
+            area = max(np.ptp(self.x), 1e-9) * max(np.ptp(self.y), 1e-9)
+            cell_size = max(2 * math.sqrt(area / len(self.x)), 1e-6)
+        self.cell_size = cell_size
+        self._points = _ElementIndex(self.x, self.y, self.x, self.y, cell_size)
+
+    def __len__(self):
+        return len(self.x)
+
+    # (index of the closest point, distance to it)
+    def nearest(self, x, y):
+        qx, qy, shape = _queries(x, y)
+        index, _, distance2 = self._points.closest(qx, qy)
+        return _shaped(index, shape), _shaped(np.sqrt(distance2), shape)
+
+def _queries(x, y):
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    return x.ravel(), y.ravel(), x.shape
+
+def _hint(hint, qx):
+    if hint is None:
+        return None
+    return np.broadcast_to(np.asarray(hint, dtype=np.int64).ravel(), qx.shape)
+
+def _shaped(values, shape):
+    values = values.reshape(shape)
+    return values[()] if shape == () else values
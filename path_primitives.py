@@ -0,0 +1,172 @@
+import math
+
+import numpy as np
+
+# Path geometry in closed form, as an alternative to integrating heading phases.
+#
+# Every path starts at the origin heading along +x and is evaluated at arbitrary arc
+# lengths: evaluate(s) returns (x, y, heading, curvature) arrays for an array of arc lengths
+# in metres, so a path can be sampled at any resolution with whole-array operations.
+#
+#   cubic_path / quintic_path  Hermite polynomial curves to an end pose. The quintic one has
+#                              zero curvature at both ends, so it joins straight road
+#                              without a curvature jump; the cubic one does not.
+#   clothoid_lane_change       two opposite clothoid S-bends whose curvature rises and falls
+#                              linearly with arc length
+#   clothoid_turn              clothoid - circular arc - clothoid turn by a given angle
+#
+# Headings and curvature are exact. Polynomial curves are reparameterized by arc length
+# through a dense lookup table; clothoid positions are integrated with 5-point
+# Gauss-Legendre quadrature between consecutive stations, which is exact to well below a
+# micrometre at any usual spacing.
+
+_GAUSS_NODES, _GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(5)
+_ARC_LENGTH_SAMPLES = 4097
+
+# Polynomial curve from the origin (heading 0) to (end_x, end_y, end_heading). degree 3
+# matches position and tangent at both ends, degree 5 also sets the second derivative to
+# zero there. tangent_scale is the tangent length at the ends, the chord length by default.
+class PolynomialPath:
+    def __init__(self, end_x, end_y, end_heading, degree=5, tangent_scale=None):
+        if degree not in (3, 5):
+            raise ValueError("degree must be 3 or 5, got %r" % (degree,))
+        if tangent_scale is None:
+            tangent_scale = math.hypot(end_x, end_y)
+        self.end_pose = (end_x, end_y, end_heading)
+        self.degree = degree
+        self.tangent_scale = tangent_scale
+
+        # rows: value, first and (degree 5) second derivative at u = 0 and u = 1
+        powers = np.arange(degree + 1)
+        rows = [np.where(powers == 0, 1.0, 0.0), np.where(powers == 1, 1.0, 0.0)]
+        ends = [np.ones(degree + 1), powers.astype(np.float64)]
+        if degree == 5:
+            rows.append(np.where(powers == 2, 2.0, 0.0))
+            ends.append(powers * (powers - 1.0))
+        matrix = np.array(rows + ends)
+        flat = [0.0] if degree == 5 else []
+        self.coefficients_x = np.linalg.solve(matrix, [0.0, tangent_scale] + flat
+            + [end_x, tangent_scale * math.cos(end_heading)] + flat)
+        self.coefficients_y = np.linalg.solve(matrix, [0.0, 0.0] + flat
+            + [end_y, tangent_scale * math.sin(end_heading)] + flat)
+
+        # arc length at a dense grid of the curve parameter, for reparameterization
+        self._u = np.linspace(0.0, 1.0, _ARC_LENGTH_SAMPLES)
+        dx, dy = self._derivatives(self._u, 1)
+        speed = np.hypot(dx, dy)
+        self._s = np.zeros(_ARC_LENGTH_SAMPLES)
+        np.cumsum(0.5 * (speed[1:] + speed[:-1]) * np.diff(self._u), out=self._s[1:])
+        self.length = float(self._s[-1])
+
+    def _derivatives(self, u, order):
+        polyval = np.polynomial.polynomial.polyval
+        polyder = np.polynomial.polynomial.polyder
+        return (polyval(u, polyder(self.coefficients_x, order)),
+            polyval(u, polyder(self.coefficients_y, order)))
+
+    def evaluate(self, s):
+        u = np.interp(np.asarray(s, dtype=np.float64), self._s, self._u)
+        x = np.polynomial.polynomial.polyval(u, self.coefficients_x)
+        y = np.polynomial.polynomial.polyval(u, self.coefficients_y)
+        dx, dy = self._derivatives(u, 1)
+        ddx, ddy = self._derivatives(u, 2)
+        speed = np.hypot(dx, dy)
+        return x, y, np.arctan2(dy, dx), (dx * ddy - dy * ddx) / (speed * speed * speed)
+
+    def __repr__(self):
+        return "PolynomialPath(%r, %r, %r, degree=%r, tangent_scale=%r)" % (
+            self.end_pose + (self.degree, self.tangent_scale))
+
+def cubic_path(end_x, end_y, end_heading=0.0, tangent_scale=None):
+    return PolynomialPath(end_x, end_y, end_heading, 3, tangent_scale)
+
+def quintic_path(end_x, end_y, end_heading=0.0, tangent_scale=None):
+    return PolynomialPath(end_x, end_y, end_heading, 5, tangent_scale)
+
+# Path whose curvature is piecewise linear in arc length: curvatures[k] at arc length
+# knots[k] (knots start at 0 and increase).
+class ClothoidPath:
+    def __init__(self, knots, curvatures):
+        self.knots = np.asarray(knots, dtype=np.float64)
+        self.curvatures = np.asarray(curvatures, dtype=np.float64)
+        self.length = float(self.knots[-1])
+        self._slopes = np.diff(self.curvatures) / np.diff(self.knots)
+        self._headings = np.zeros(len(self.knots))
+        np.cumsum(0.5 * (self.curvatures[1:] + self.curvatures[:-1]) * np.diff(self.knots),
+            out=self._headings[1:])
+
+    def _segment(self, s):
+        return np.clip(np.searchsorted(self.knots, s, side='right') - 1, 0, len(self.knots) - 2)
+
+    def heading(self, s):
+        k = self._segment(s)
+        offset = s - self.knots[k]
+        return self._headings[k] + self.curvatures[k] * offset + 0.5 * self._slopes[k] * offset * offset
+
+    def curvature(self, s):
+        k = self._segment(s)
+        return self.curvatures[k] + self._slopes[k] * (s - self.knots[k])
+
+    def evaluate(self, s):
+        s = np.clip(np.asarray(s, dtype=np.float64), 0.0, self.length)
+        # integrate between every pair of consecutive stations, knots included, so the
+        # heading is a single quadratic on every interval
+        grid = np.union1d(s.ravel(), self.knots)
+        middle = 0.5 * (grid[1:] + grid[:-1])
+        half = 0.5 * np.diff(grid)
+        heading = self.heading(middle[:, None] + half[:, None] * _GAUSS_NODES)
+        x = np.zeros(len(grid))
+        y = np.zeros(len(grid))
+        np.cumsum(half * (np.cos(heading) @ _GAUSS_WEIGHTS), out=x[1:])
+        np.cumsum(half * (np.sin(heading) @ _GAUSS_WEIGHTS), out=y[1:])
+        position = np.searchsorted(grid, s)
+        return x[position], y[position], self.heading(s), self.curvature(s)
+
+    def __repr__(self):
+        return "ClothoidPath(%r, %r)" % (self.knots.tolist(), self.curvatures.tolist())
+
+# end point of the unit-length S-bend whose heading peaks at peak_heading halfway
+def _unit_lane_change_end(peak_heading):
+    path = ClothoidPath([0.0, 0.25, 0.5, 0.75, 1.0],
+        [0.0, 4 * peak_heading, 0.0, -4 * peak_heading, 0.0])
+    x, y, _, _ = path.evaluate(np.linspace(0.0, 1.0, 65))
+    return x[-1], y[-1]
+
+# Lane change by offset metres (positive left) over length metres along x: curvature ramps
+# linearly up, down through zero to the opposite peak and back to zero. The peak heading
+# follows from the offset / length ratio, which only depends on the shape.
+def clothoid_lane_change(offset, length):
+    if length <= 0:
+        raise ValueError("length must be positive, got %r" % (length,))
+    if offset == 0:
+        return ClothoidPath([0.0, length], [0.0, 0.0])
+    ratio = abs(offset) / length
+    low, high = 0.0, 0.5 * math.pi
+    for _ in range(60):
+        middle = 0.5 * (low + high)
+        x, y = _unit_lane_change_end(middle)
+        if y / x < ratio:
+            low = middle
+        else:
+            high = middle
+    peak_heading = 0.5 * (low + high)
+    x, _ = _unit_lane_change_end(peak_heading)
+    total = length / x
+    peak_curvature = math.copysign(4 * peak_heading / total, offset)
+    return ClothoidPath(total * np.array([0.0, 0.25, 0.5, 0.75, 1.0]),
+        [0.0, peak_curvature, 0.0, -peak_curvature, 0.0])
+
+# Turn by angle radians (positive left) on a circular arc of radius metres, entered and
+# left through clothoids of transition_length metres (a third of the turn's arc length
+# by default).
+def clothoid_turn(angle, radius, transition_length=None):
+    arc = abs(angle) * radius
+    if transition_length is None:
+        transition_length = arc / 3
+    if transition_length > arc:
+        raise ValueError("transition_length %r is too long for a %r rad turn of radius %r"
+            % (transition_length, angle, radius))
+    curvature = math.copysign(1.0 / radius, angle)
+    circle = arc - transition_length
+    return ClothoidPath([0.0, transition_length, transition_length + circle,
+        2 * transition_length + circle], [0.0, curvature, curvature, 0.0])
@@ -0,0 +1,172 @@
+import argparse
+import math
+
+import numpy as np
+
+import instrumentation
+from trajectory_cache import scenario_fingerprint
+from trajectory_core import TRAJECTORY_FIELDS, Scenario, Trajectory, get_scenario
+
+# Long missions composed of scenario segments: straight, lane change, junction turn, ...
+#
+# Every segment is generated on its own, starting at the origin with heading 0 like any
+# scenario, and then placed where the previous segment ends: rotated by the end heading,
+# translated to the end point and shifted by the end time. The first point of every later
+# segment is the last point of the one before it and is dropped. A segment starts at the
+# speed the previous one ends at (the route's initial_speed for the first one), so only
+# its final_speed is set per segment.
+#
+# heading_rad keeps the convention of trajectory_core.TRAJECTORY_FIELDS along the whole
+# route; acceleration_mps2 and heading_rate_rps are each segment's own values.
+#
+# The composed columns live in one preallocated array that grows by doubling. update()
+# regenerates only the segments whose parameters (including the start speed inherited from
+# the previous segment) changed since the last update. Unchanged segments after an edit are
+# only moved, and only if their start moved: a rigid transform of the stored segment, no
+# generation.
+
+class RouteSegment:
+    # scenario is a registered name or a Scenario; None parameters use the scenario's values
+    def __init__(self, scenario, final_speed=None, heading_rate_increments=None):
+        if not isinstance(scenario, Scenario):
+            scenario = get_scenario(scenario)
+        self.scenario = scenario
+        self.final_speed = scenario.final_speed if final_speed is None else final_speed
+        self.heading_rate_increments = (scenario.heading_rate_increments
+            if heading_rate_increments is None else heading_rate_increments)
+        self._key = None
+        self._local = None
+        self._placement = None
+
+    def __repr__(self):
+        return "RouteSegment(%r, final_speed=%r, heading_rate_increments=%r)" % (
+            self.scenario.name, self.final_speed, self.heading_rate_increments)
+
+class Route:
+    def __init__(self, segments=(), initial_speed=None, capacity=1024):
+        self.segments = list(segments)
+        self.initial_speed = initial_speed
+        self.regenerated = 0
+        self._columns = np.empty((len(TRAJECTORY_FIELDS), capacity))
+        self._size = 0
+        self._offsets = []
+        self._placed = []
+
+    def append(self, segment):
+        self.segments.append(segment)
+
+    # changes parameters of segment index in place, e.g. set_segment(2, final_speed=8.0)
+    def set_segment(self, index, **params):
+        segment = self.segments[index]
+        for name, value in params.items():
+            if name not in ('scenario', 'final_speed', 'heading_rate_increments'):
+                raise ValueError("unknown segment parameter %r" % (name,))
+            if name == 'scenario' and not isinstance(value, Scenario):
+                value = get_scenario(value)
+            setattr(segment, name, value)
+
+    # grows the storage to at least size points, keeping the first valid ones
+    def _reserve(self, size, valid):
+        if size <= self._columns.shape[1]:
+            return
+        columns = np.empty((len(TRAJECTORY_FIELDS), max(size, 2 * self._columns.shape[1])))
+        columns[:, :valid] = self._columns[:, :valid]
+        self._columns = columns
+
+    # regenerates changed segments and re-places the ones after them; returns the route
+    def update(self):
+        # a removed segment's old place may have been overwritten since
+        current = set(map(id, self.segments))
+        for segment in self._placed:
+            if id(segment) not in current:
+                segment._placement = None
+        self._placed = list(self.segments)
+        if not self.segments:
+            self._size = 0
+            self._offsets = []
+            return self.trajectory()
+        speed = self.initial_speed
+        if speed is None:
+            speed = self.segments[0].scenario.initial_speed
+        start = (0.0, 0.0, 0.0, 0.0) # x, y, heading, time
+        offset = 0
+        offsets = []
+        for i, segment in enumerate(self.segments):
+            key = (segment.scenario.name, scenario_fingerprint(segment.scenario), speed,
+                segment.final_speed, segment.heading_rate_increments)
+            if key != segment._key:
+                segment._local = segment.scenario.generate(speed, segment.final_speed,
+                    segment.heading_rate_increments).columns.copy()
+                segment._key = key
+                segment._placement = None
+                self.regenerated += 1
+                instrumentation.count('route.segments_regenerated')
+
+            local = segment._local if i == 0 else segment._local[:, 1:]
+            placement = (offset, start)
+            if placement != segment._placement:
+                self._reserve(offset + local.shape[1], offset)
+                self._place(local, offset, start)
+                segment._placement = placement
+            offsets.append(offset)
+            offset += local.shape[1]
+            end = self._columns[:, offset - 1]
+            start = (float(end[1]), float(end[2]), math.degrees(end[3]), float(end[0]))
+            speed = float(end[4])
+        self._size = offset
+        self._offsets = offsets
+        return self.trajectory()
+
+    def _place(self, local, offset, start):
+        x, y, heading, time = start
+        cos, sin = math.cos(heading), math.sin(heading)
+        out = self._columns[:, offset:offset + local.shape[1]]
+        out[0] = local[0] + time
+        out[1] = x + cos * local[1] - sin * local[2]
+        out[2] = y + sin * local[1] + cos * local[2]
+        out[3] = local[3] + math.radians(heading)
+        out[4:] = local[4:]
+
+    # the composed route as of the last update(); a view that later updates overwrite
+    def trajectory(self):
+        return Trajectory(self._columns[:, :self._size])
+
+    # the points of segment index within the composed route, also a view
+    def segment_trajectory(self, index):
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self._size
+        return Trajectory(self._columns[:, self._offsets[index]:end])
+
+    def __len__(self):
+        return self._size
+
+    def __str__(self):
+        lines = ["{:<3} {:<28} {:>7} {:>9} {:>9} {:>9} {:>9}".format('#', 'scenario', 'points',
+            'end x', 'end y', 'end hdg', 'end s')]
+        for i, segment in enumerate(self.segments[:len(self._offsets)]):
+            part = self.segment_trajectory(i).columns
+            lines.append("{:<3} {:<28} {:>7} {:>9.2f} {:>9.2f} {:>9.4f} {:>9.2f}".format(i,
+                segment.scenario.name, part.shape[1], part[1, -1], part[2, -1], part[3, -1],
+                part[0, -1]))
+        return "\n".join(lines)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compose scenarios into one route.")
+    parser.add_argument('segments', nargs='+', metavar='SCENARIO[:FINAL_SPEED]',
+        help="segments in driving order, e.g. straight lane_change:8 junction_turning:3")
+    parser.add_argument('--initial-speed', type=float)
+    parser.add_argument('--output', help="save the route (.csv or .npz)")
+    args = parser.parse_args(args)
+
+    route = Route(initial_speed=args.initial_speed)
+    for spec in args.segments:
+        name, _, final_speed = spec.partition(':')
+        route.append(RouteSegment(name, float(final_speed) if final_speed else None))
+    trajectory = route.update()
+    print(route)
+    if args.output:
+        from trajectory_export import save_trajectory
+        save_trajectory(args.output, trajectory)
+    return route
+
+if __name__ == '__main__':
+    main()
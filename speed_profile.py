@@ -0,0 +1,233 @@
+import numpy as np
+
+# Accelerate / cruise / brake speed profile, solved analytically.
+#
+# The profile accelerates by speed_increments per point, is capped at speed_max, and starts
+# braking at stopping_decel once the predicted stopping distance covers the rest of the
+# route; it never brakes below final_speed. Both switch points come from closed-form
+# expressions, so the speed at any point can be computed independently of its neighbours.
+#
+# The braking speeds follow w_{k+1} = w_k - decel * d / w_k (the step-by-step deceleration
+# the generators always used). Its closed-form approximation
+#     w_k^2 = w_0^2 - 2*decel*d*k + (decel*d)/2 * ln((w_0^2 + decel*d) / (w_0^2 - 2*decel*d*k + decel*d))
+# is within about 1e-1 m/s of it while the speed stays well above sqrt(decel * d), and
+# breaks down close to a standstill. So the closed form is used while w_k^2 is above
+# TAIL_SQUARED * decel * d, and the last few steps to a standstill are stepped with the
+# recursion itself. By default the closed-form part is corrected by fixed-point passes
+# until it matches the recursion to within 1e-8; every pass shrinks the error by a factor
+# of about TAIL_SQUARED^2, so that takes 5-6 passes, and rows that have converged drop out
+# of later passes. refine_passes limits the number of passes, 0 keeps the closed form (its
+# speeds are within about 1e-2 m/s, but times after a crawl to a standstill can be off by
+# many seconds, as they are d / speed of a speed close to zero).
+#
+# Parameters are 1-D arrays of length n (one profile per element); results are
+# (n, num_points) arrays. The array passes have a fixed cost of a few hundred NumPy calls,
+# so when a call covers at most STEPPED_POINTS points in all (a single trajectory of
+# Trajectory.capacity points, or a few of them) the profiles are stepped point by point in
+# plain floats instead, like the original generators did. Past about twice that the
+# stepping costs more than the array passes.
+
+STEPPED_POINTS = 500
+
+# predicted stopping distance from the speed reached after the next increment, as checked
+# at point p (1-based loop index p + 1) of the accelerating profile
+def _starts_braking(p, num_points, discretization_distance_m, initial_speed, final_speed,
+        speed_increments, speed_max, stopping_decel):
+    # the first point keeps initial_speed even above speed_max
+    speed = np.where(p == 1, initial_speed,
+        np.minimum(initial_speed + (p - 1) * speed_increments, speed_max))
+    next_speed = speed + speed_increments + speed_increments
+    predicted_stopping_time = (next_speed - final_speed) / stopping_decel
+    predicted_stopping_distance = next_speed * predicted_stopping_time \
+        - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
+    return (num_points - p - 2) * discretization_distance_m <= predicted_stopping_distance
+
+# Returns (cruise, brake): the first point index whose accelerating speed is capped at
+# speed_max, and the first point index that brakes (num_points if it never does).
+def switch_points(num_points, discretization_distance_m, initial_speed, final_speed,
+        speed_increments, speed_max, stopping_decel):
+    initial_speed = np.asarray(initial_speed, dtype=np.float64).reshape(-1)
+    final_speed = np.broadcast_to(np.asarray(final_speed, dtype=np.float64), initial_speed.shape)
+    d = discretization_distance_m
+    decel_distance = 2.0 * stopping_decel * d
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if speed_increments > 0:
+            cruise = np.ceil((speed_max - initial_speed) / speed_increments)
+        else:
+            cruise = np.where(initial_speed >= speed_max, 0.0, np.inf)
+        cruise = np.clip(cruise, 0, num_points)
+
+        # while accelerating, braking starts at the first q = p + 1 with
+        # (v0 + q*inc)^2 - vf^2 >= 2*decel*d*(num_points - q - 1), a quadratic in q
+        a = speed_increments * speed_increments
+        b = 2.0 * initial_speed * speed_increments + decel_distance
+        c = initial_speed * initial_speed - final_speed * final_speed \
+            - decel_distance * (num_points - 1)
+        if a > 0:
+            discriminant = b * b - 4.0 * a * c
+            root = np.where(discriminant >= 0,
+                (-b + np.sqrt(np.maximum(discriminant, 0.0))) / (2.0 * a), -np.inf)
+        else:
+            root = -c / b
+        accelerating = np.ceil(root - 1.0)
+
+        # once capped, the predicted stopping distance is constant
+        capped_speed = speed_max + 2.0 * speed_increments
+        capped = np.ceil(num_points - 2
+            - (capped_speed * capped_speed - final_speed * final_speed) / decel_distance)
+        capped = np.maximum(capped, cruise + 1)
+
+    brake = np.where(accelerating <= cruise, accelerating, capped)
+    brake = np.clip(np.nan_to_num(brake, nan=num_points, posinf=num_points, neginf=1),
+        1, num_points).astype(np.int64)
+
+    # the condition is monotonic in p past the first point, so rounding can only put the
+    # root one point off
+    args = (num_points, d, initial_speed, final_speed, speed_increments, speed_max,
+        stopping_decel)
+    earlier = (brake > 1) & _starts_braking(brake - 1, *args)
+    later = (brake < num_points) & ~_starts_braking(brake, *args)
+    brake = np.where(earlier, brake - 1, np.where(later, brake + 1, brake))
+    brake = np.where((brake < num_points) & _starts_braking(brake, *args), brake, num_points)
+    # an initial_speed above speed_max only counts at the first point
+    if num_points > 1:
+        brake = np.where(_starts_braking(1, *args), 1, brake)
+    return cruise.astype(np.int64), brake
+
+# squared speed (in units of decel * d) below which the closed form is replaced by stepping
+# the recursion; the speed reaches a standstill within about TAIL_SQUARED / 2 steps of it
+TAIL_SQUARED = 16.0
+
+# closed-form braking speeds, refined onto the step-by-step recursion; steps counts the
+# points since braking started (negative before that)
+def braking_speeds(start_speed, decel_step, floor_speed, steps, refine_passes=None):
+    braking = steps >= 0
+    start_squared = start_speed[:, None] ** 2
+    base = start_squared - 2.0 * decel_step * steps
+    floor = np.minimum(np.maximum(floor_speed, 1e-6)[:, None] ** 2, start_squared)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correction = 0.5 * decel_step * np.log((start_squared + decel_step)
+            / np.maximum(base + decel_step, decel_step))
+    squared = np.maximum(base + np.where(braking, correction, 0.0), floor)
+
+    # the tail from the first point after the start that is close to a standstill
+    tail = np.logical_or.accumulate((steps > 0) & (squared < TAIL_SQUARED * decel_step),
+        axis=-1)
+    bulk = braking & ~tail
+
+    # Fixed-point passes over the rows that have not converged yet; a point only depends on
+    # the ones before it, so leaving the tail out does not change the bulk.
+    if refine_passes is None:
+        refine_passes = steps.shape[-1]
+    rows = np.flatnonzero(bulk[:, 1:].any(axis=-1))
+    current, active_base, active_floor = squared[rows], base[rows], floor[rows]
+    active_braking, active_bulk = braking[rows], bulk[rows]
+    correction = np.zeros_like(current)
+    for _ in range(refine_passes):
+        if len(rows) == 0:
+            break
+        terms = np.where(active_braking, decel_step * decel_step / current, 0.0)
+        np.cumsum(terms[:, :-1], axis=-1, out=correction[:, 1:])
+        updated = np.where(active_bulk, np.maximum(active_base + correction, active_floor),
+            current)
+        changed = (np.abs(updated - current) > 1e-12 * updated).any(axis=-1)
+        squared[rows] = updated
+        current = updated
+        if not changed.all():
+            rows, current, correction = rows[changed], current[changed], correction[changed]
+            active_base, active_floor = active_base[changed], active_floor[changed]
+            active_braking, active_bulk = active_braking[changed], active_bulk[changed]
+
+    # Step the recursion through the tail until every row is below floor_speed. The values
+    # after that point are not used by speed_profile().
+    speed = np.sqrt(squared)
+    num_points = steps.shape[-1]
+    first = np.where(tail.any(axis=-1), tail.argmax(axis=-1), num_points)
+    rows = np.flatnonzero(first < num_points)
+    if len(rows):
+        previous = speed[rows, first[rows] - 1]
+        tail_floor = floor_speed[rows]
+        moving = np.ones(len(rows), dtype=bool)
+        tail_speeds = []
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            while moving.any() and len(tail_speeds) < num_points:
+                previous = previous - decel_step / previous
+                tail_speeds.append(previous)
+                moving &= (previous > 0) & (previous - decel_step / previous >= tail_floor)
+        index = first[rows, None] + np.arange(len(tail_speeds))
+        inside = index < num_points
+        speed[np.broadcast_to(rows[:, None], index.shape)[inside], index[inside]] = \
+            np.stack(tail_speeds, axis=-1)[inside]
+    return speed
+
+# the profile of one parameter set, stepped point by point; returns two lists
+def _stepped_profile(num_points, d, initial_speed, final_speed, speed_increments, speed_max,
+        stopping_decel):
+    speed = initial_speed
+    seconds = d / speed if speed > 0 else 0.0
+    times, speeds = [0.0], [speed]
+    decelerating = False
+    for i in range(2, num_points + 1):
+        if not decelerating:
+            speed += speed_increments
+            next_speed = speed + speed_increments
+            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
+            predicted_stopping_distance = next_speed * predicted_stopping_time \
+                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
+            decelerating = (num_points - i - 1) * d <= predicted_stopping_distance
+        speed = min(speed, speed_max)
+        if speed > 0:
+            dt = d / speed
+            seconds += dt
+            if decelerating:
+                speed = max(final_speed, speed - stopping_decel * dt)
+        times.append(seconds)
+        speeds.append(speed)
+    return times, speeds
+
+# returns (time_from_start, longitudinal_velocity_mps), each of shape (n, num_points)
+def speed_profile(num_points, discretization_distance_m, initial_speed, final_speed,
+        speed_increments, speed_max, stopping_decel, refine_passes=None):
+    initial_speed, final_speed = (a.reshape(-1) for a in np.broadcast_arrays(
+        np.asarray(initial_speed, dtype=np.float64), np.asarray(final_speed, dtype=np.float64)))
+    batch = initial_speed.shape[0]
+    d = discretization_distance_m
+    if batch * num_points <= STEPPED_POINTS and refine_passes is None:
+        profiles = [_stepped_profile(num_points, d, float(v0), float(vf), speed_increments,
+            speed_max, stopping_decel) for v0, vf in zip(initial_speed, final_speed)]
+        return (np.array([times for times, _ in profiles]).reshape(batch, num_points),
+            np.array([speeds for _, speeds in profiles]).reshape(batch, num_points))
+    _, brake = switch_points(num_points, d, initial_speed, final_speed, speed_increments,
+        speed_max, stopping_decel)
+
+    p = np.arange(num_points)
+    speed = np.minimum(initial_speed[:, None] + p * speed_increments, speed_max)
+    speed[:, 0] = initial_speed
+
+    # speed used for the time step of each point, and the speed stored on it
+    used_speed = speed.copy()
+    if (brake < num_points).any():
+        decel_step = stopping_decel * d
+        steps = p - brake[:, None]
+        braking = steps >= 0
+        start_speed = speed[np.arange(batch), np.minimum(brake, num_points - 1)]
+        used = braking_speeds(start_speed, decel_step, final_speed, steps, refine_passes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            reached = used - decel_step / used
+        below = braking & ~((used > 0) & (reached >= final_speed[:, None]))
+        below = np.logical_or.accumulate(below, axis=-1)
+        reached = np.where(below, final_speed[:, None], reached)
+        # speed_max still caps the speed a step is taken at, even when final_speed exceeds it
+        used[:, 1:] = np.where(below[:, :-1], np.minimum(final_speed[:, None], speed_max),
+            used[:, 1:])
+        used_speed = np.where(braking, used, used_speed)
+        speed = np.where(braking, reached, speed)
+
+    moving = used_speed[:, 1:] > 0
+    seconds_delta = np.where(moving, d / np.where(moving, used_speed[:, 1:], 1.0), 0.0)
+    seconds = np.zeros((batch, num_points))
+    seconds[:, 1:] = np.where(initial_speed[:, None] > 0,
+        d / np.where(initial_speed[:, None] > 0, initial_speed[:, None], 1.0), 0.0)
+    seconds[:, 1:] += np.cumsum(seconds_delta, axis=-1)
+    return seconds, speed
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from feasibility import VehicleLimits, feasible_mask
+from trajectory_cache import scenario_fingerprint
+from trajectory_core import Scenario, get_scenario, parameter_grid
+
+# Splits a parameter grid across a process pool. Each shard covers a fixed, contiguous
+# range of the flattened grid and is written to its own file, so the shard layout (and
+# therefore every shard's content) only depends on the grid and shard_size, never on the
+# number of workers or the order in which they finish.
+#
+# Every shard stores what it was generated from: the scenario and its fingerprint, the
+# shard's grid range, a hash of its parameters and the vehicle limits. A rerun into the
+# same directory only keeps shards whose metadata matches, the rest are regenerated.
+
+def shard_ranges(num_params, shard_size):
+    return [(start, min(start + shard_size, num_params))
+        for start in range(0, num_params, shard_size)]
+
+def shard_path(output_dir, shard_index):
+    return os.path.join(output_dir, "shard_%05d.npz" % shard_index)
+
+def parameters_hash(initial_speed, final_speed, heading_rate_increments):
+    digest = hashlib.sha1()
+    for values in (initial_speed, final_speed, heading_rate_increments):
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+# what a shard of grid range [start, stop) is generated from, stored in the shard
+def shard_metadata(scenario, start, stop, initial_speed, final_speed, heading_rate_increments,
+        limits=None):
+    return {'scenario': scenario.name, 'fingerprint': scenario_fingerprint(scenario),
+        'start': start, 'stop': stop,
+        'parameters': parameters_hash(initial_speed, final_speed, heading_rate_increments),
+        'limits': None if limits is None else repr(limits)}
+
+# metadata stored in the shard at path, or None if it has none or cannot be read
+def read_shard_metadata(path):
+    try:
+        with np.load(path) as shard:
+            return json.loads(str(shard['metadata']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+# generate one shard and write it next to the others; runs inside a worker process. With
+# limits, only the trajectories that pass the feasibility checks are written; grid_index
+# holds the position in the whole grid of every trajectory that was kept.
+def run_shard(scenario, shard_index, initial_speed, final_speed, heading_rate_increments,
+        output_dir, limits=None, metadata=None):
+    started = time.perf_counter()
+    count = len(initial_speed)
+    start = 0 if metadata is None else metadata['start']
+    grid_index = np.arange(start, start + count)
+    trajectories = scenario.generate_batch(initial_speed, final_speed, heading_rate_increments)
+    if limits is not None:
+        feasible = feasible_mask(trajectories, limits)
+        trajectories = trajectories[feasible]
+        initial_speed = initial_speed[feasible]
+        final_speed = final_speed[feasible]
+        heading_rate_increments = heading_rate_increments[feasible]
+        grid_index = grid_index[feasible]
+
+    # write under a temporary name first so an interrupted run never leaves a partial shard
+    path = shard_path(output_dir, shard_index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, initial_speed=initial_speed, final_speed=final_speed,
+            heading_rate_increments=heading_rate_increments, trajectories=trajectories,
+            grid_index=grid_index, metadata=json.dumps(metadata))
+    os.replace(tmp_path, path)
+    return shard_index, path, count, time.perf_counter() - started
+
+class SweepSummary:
+    def __init__(self, scenario_name, shard_paths, num_trajectories, seconds):
+        self.scenario_name = scenario_name
+        self.shard_paths = shard_paths
+        self.num_trajectories = num_trajectories
+        self.seconds = seconds
+
+    @property
+    def trajectories_per_second(self):
+        return self.num_trajectories / self.seconds if self.seconds > 0 else float('inf')
+
+    def __str__(self):
+        return "{}: {} trajectories in {} shards, {:.2f}s ({:.0f} trajectories/s)".format(
+            self.scenario_name, self.num_trajectories, len(self.shard_paths), self.seconds,
+            self.trajectories_per_second)
+
+# scenario is a registered name or a Scenario; the parameters are flattened arrays of equal
+# length, e.g. from parameter_grid(). Shards that already exist are kept when skip_existing
+# is set and they were generated from the same scenario, parameters and limits, so an
+# interrupted sweep can be resumed by running it again. limits (a feasibility.VehicleLimits)
+# drops infeasible trajectories before they are written.
+def run_sweep(scenario, initial_speed, final_speed, heading_rate_increments, output_dir,
+        shard_size=4096, max_workers=None, skip_existing=True, report=print, limits=None):
+    if not isinstance(scenario, Scenario):
+        scenario = get_scenario(scenario)
+    initial_speed, final_speed, heading_rate_increments = (np.ravel(a).astype(np.float64)
+        for a in np.broadcast_arrays(initial_speed, final_speed, heading_rate_increments))
+    os.makedirs(output_dir, exist_ok=True)
+
+    ranges = shard_ranges(len(initial_speed), shard_size)
+    shard_paths = [shard_path(output_dir, i) for i in range(len(ranges))]
+    metadata = [shard_metadata(scenario, start, stop, initial_speed[start:stop],
+        final_speed[start:stop], heading_rate_increments[start:stop], limits)
+        for start, stop in ranges]
+    pending = []
+    for i, path in enumerate(shard_paths):
+        if skip_existing and os.path.exists(path):
+            if read_shard_metadata(path) == metadata[i]:
+                continue
+            if report is not None:
+                report("{} does not match this sweep, regenerating".format(
+                    os.path.basename(path)))
+        pending.append(i)
+    total = sum(ranges[i][1] - ranges[i][0] for i in pending)
+
+    started = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for i in pending:
+            start, stop = ranges[i]
+            futures.append(executor.submit(run_shard, scenario, i, initial_speed[start:stop],
+                final_speed[start:stop], heading_rate_increments[start:stop], output_dir, limits,
+                metadata[i]))
+        for completed, future in enumerate(as_completed(futures), 1):
+            shard_index, path, count, _ = future.result()
+            done += count
+            elapsed = time.perf_counter() - started
+            if report is not None:
+                report("shard {}/{} ({}) done: {}/{} trajectories, {:.0f} trajectories/s".format(
+                    completed, len(futures), os.path.basename(path), done, total,
+                    done / elapsed if elapsed > 0 else float('inf')))
+
+    summary = SweepSummary(scenario.name, shard_paths, done, time.perf_counter() - started)
+    with open(os.path.join(output_dir, "manifest.json"), 'w') as f:
+        json.dump({'scenario': scenario.name, 'fingerprint': scenario_fingerprint(scenario),
+            'shard_size': shard_size, 'num_params': len(initial_speed),
+            'parameters': parameters_hash(initial_speed, final_speed, heading_rate_increments),
+            'limits': None if limits is None else repr(limits),
+            'shards': [os.path.basename(p) for p in shard_paths]}, f, indent=2)
+    if report is not None:
+        report(str(summary))
+    return summary
+
+# Load every shard of a sweep back into one (n, num_points, fields) array, in grid order.
+# A sweep run with limits is missing its infeasible trajectories, so row k is not grid
+# point k; with return_indices, the grid index of every row is returned as well.
+def load_sweep(output_dir, return_indices=False):
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    trajectories, grid_index = [], []
+    for name in manifest['shards']:
+        with np.load(os.path.join(output_dir, name)) as shard:
+            trajectories.append(shard['trajectories'])
+            grid_index.append(shard['grid_index'])
+    if return_indices:
+        return np.concatenate(trajectories), np.concatenate(grid_index)
+    return np.concatenate(trajectories)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Generate a parameter sweep of a scenario.")
+    parser.add_argument('scenario')
+    parser.add_argument('output_dir')
+    parser.add_argument('--initial-speed', nargs=3, type=float, metavar=('START', 'STOP', 'NUM'),
+        help="initial speeds in m/s, as for numpy.linspace")
+    parser.add_argument('--final-speed', nargs=3, type=float, metavar=('START', 'STOP', 'NUM'),
+        help="final speeds in m/s, as for numpy.linspace")
+    parser.add_argument('--heading-rate-increments', nargs=3, type=float,
+        metavar=('START', 'STOP', 'NUM'), help="heading rate increments, as for numpy.linspace")
+    parser.add_argument('--shard-size', type=int, default=4096)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--overwrite', action='store_true', help="regenerate existing shards")
+    parser.add_argument('--feasible-only', action='store_true',
+        help="drop trajectories that violate the default vehicle limits")
+    args = parser.parse_args(args)
+
+    # unspecified ranges default to the scenario's slider range
+    scenario = get_scenario(args.scenario)
+    def values(spec, value_range):
+        if spec is None:
+            return np.linspace(value_range[0], value_range[1], 10)
+        return np.linspace(spec[0], spec[1], int(spec[2]))
+
+    grid = parameter_grid(values(args.initial_speed, scenario.initial_speed_range),
+        values(args.final_speed, scenario.final_speed_range),
+        values(args.heading_rate_increments, scenario.heading_rate_increments_range))
+    run_sweep(scenario, *grid, args.output_dir, shard_size=args.shard_size,
+        max_workers=args.workers, skip_existing=not args.overwrite,
+        limits=VehicleLimits() if args.feasible_only else None)
+
+if __name__ == '__main__':
+    main()
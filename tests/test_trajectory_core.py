@@ -0,0 +1,25 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from path_primitives import quintic_path
+from trajectory_core import generate_path_trajectory, resample
+
+# a path that turns past pi: its heading column wraps from +pi to -pi halfway, and
+# resampling must follow the turn instead of interpolating back through 0
+def test_resample_follows_heading_across_pi():
+    trajectory = generate_path_trajectory(quintic_path(-10, 20, 3.6), 0.5, 3.0, 3.0)
+    heading = np.degrees(trajectory.heading_rad)
+    assert heading.max() > 3.0 and heading.min() < -3.0
+
+    distance = trajectory.arc_length()
+    for method in ('linear', 'cubic'):
+        resampled = resample(trajectory, 'distance', np.linspace(0, distance[-1], 400), method)
+        resampled_heading = np.degrees(resampled.heading_rad)
+        assert np.abs(np.diff(resampled_heading)).max() < 0.1
+        # back at the original stations, the headings agree up to whole turns
+        at_points = np.degrees(resample(trajectory, 'distance', distance, method).heading_rad)
+        turns = (at_points - heading) / (2 * np.pi)
+        assert np.allclose(turns, np.round(turns), atol=1e-9)
@@ -0,0 +1,30 @@
+import os
+import sys
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trajectory_planner
+
+# the frame left on the canvas by the blitted slider updates has to be the one a full
+# redraw produces, without leftovers of earlier trajectories in the cached background
+def test_blitted_frame_matches_full_redraw():
+    trajectory_planner.export_path = False
+    trajectory_planner.frame_interval_s = 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        trajectory_planner.plot_trajectory(trajectory_planner.get_trajectory())
+    canvas = trajectory_planner.fig.canvas
+    canvas.draw()
+
+    slider = trajectory_planner.sliders['heading_rate_increments']
+    slider.set_val(slider.valmax)
+    trajectory_planner.sliders['index'].set_val(len(trajectory_planner.x) // 2)
+    blitted = np.asarray(canvas.buffer_rgba()).copy()
+
+    canvas.draw()
+    redrawn = np.asarray(canvas.buffer_rgba())
+    assert (blitted != redrawn).any(axis=-1).sum() == 0
@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from trajectory_core import Scenario, Trajectory, get_scenario
+
+# LRU cache of generated trajectories.
+#
+# Keys are the scenario plus its parameters quantized to speed_quantum (m/s) and
+# heading_rate_quantum; the trajectory is generated from the quantized values, so every
+# request that maps to a key gets exactly the trajectory stored under it. Cached
+# trajectories are shared between callers and therefore read-only.
+# The cache can be saved to and loaded from an .npz file. Entries whose scenario definition
+# changed since they were saved are dropped on load.
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'currsize', 'maxsize'])
+
+# everything about a scenario that affects the generated trajectory
+def scenario_fingerprint(scenario):
+    return repr((scenario.length, scenario.discretization_m, scenario.heading_phases,
+        scenario.speed_increments, scenario.speed_max, scenario.stopping_decel,
+        scenario.heading_rate_max, scenario.num_points_max, scenario.path))
+
+class TrajectoryCache:
+    def __init__(self, maxsize=256, speed_quantum=1e-3, heading_rate_quantum=1e-7):
+        self.maxsize = maxsize
+        self.speed_quantum = speed_quantum
+        self.heading_rate_quantum = heading_rate_quantum
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, scenario, initial_speed, final_speed, heading_rate_increments):
+        return (scenario.name, int(round(initial_speed / self.speed_quantum)),
+            int(round(final_speed / self.speed_quantum)),
+            int(round(heading_rate_increments / self.heading_rate_quantum)))
+
+    # scenario is a registered name or a Scenario; missing parameters use its defaults
+    def get(self, scenario, initial_speed=None, final_speed=None, heading_rate_increments=None):
+        if not isinstance(scenario, Scenario):
+            scenario = get_scenario(scenario)
+        if initial_speed is None:
+            initial_speed = scenario.initial_speed
+        if final_speed is None:
+            final_speed = scenario.final_speed
+        if heading_rate_increments is None:
+            heading_rate_increments = scenario.heading_rate_increments
+        key = self._key(scenario, initial_speed, final_speed, heading_rate_increments)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == scenario_fingerprint(scenario):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        trajectory = scenario.generate(key[1] * self.speed_quantum, key[2] * self.speed_quantum,
+            key[3] * self.heading_rate_quantum)
+        trajectory.columns.setflags(write=False)
+        self._put(key, scenario_fingerprint(scenario), trajectory)
+        return trajectory
+
+    def _put(self, key, fingerprint, trajectory):
+        with self._lock:
+            self._entries[key] = (fingerprint, trajectory)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, len(self._entries), self.maxsize)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # entries are written least recently used first, so loading restores the LRU order
+    def save(self, path):
+        with self._lock:
+            entries = list(self._entries.items())
+        arrays = {
+            'names': np.array([key[0] for key, _ in entries], dtype=str),
+            'params': np.array([key[1:] for key, _ in entries], dtype=np.int64).reshape(-1, 3),
+            'fingerprints': np.array([entry[0] for _, entry in entries], dtype=str),
+            'quanta': np.array([self.speed_quantum, self.heading_rate_quantum]),
+        }
+        for i, (_, entry) in enumerate(entries):
+            arrays['columns_%d' % i] = entry[1].columns
+        np.savez(path, **arrays)
+
+    # returns the number of entries restored
+    def load(self, path):
+        restored = 0
+        with np.load(path) as data:
+            if not np.array_equal(data['quanta'], [self.speed_quantum, self.heading_rate_quantum]):
+                return 0
+            for i, (name, params, fingerprint) in enumerate(zip(data['names'], data['params'],
+                    data['fingerprints'])):
+                try:
+                    current = scenario_fingerprint(get_scenario(str(name)))
+                except KeyError:
+                    continue
+                if current != str(fingerprint):
+                    continue
+                trajectory = Trajectory(data['columns_%d' % i])
+                trajectory.columns.setflags(write=False)
+                self._put((str(name),) + tuple(int(p) for p in params), current, trajectory)
+                restored += 1
+        return restored
@@ -0,0 +1,553 @@
+import math
+
+import numpy as np
+
+import instrumentation
+from path_index import PathIndex
+from path_primitives import clothoid_lane_change, clothoid_turn, quintic_path
+from speed_profile import speed_profile
+
+def to_mps(kmph):
+    return (kmph * 1000)/3600
+
+def to_kmph(mps):
+    return (mps * 3600) / 1000
+
+# Column layout of Trajectory.columns, one contiguous float64 row per field. The derived
+# columns keep the definitions of the original generator, for every backend:
+#   heading_rad        radians(heading) of the heading in radians, so math.degrees() of it
+#                      is the heading in radians (and it is exported as heading_degrees)
+#   acceleration_mps2  speed change of the step over the time since the start
+#   heading_rate_rps   heading change (rad) of the step over the time since the start
+# Use the x/y steps (path_index.py) or feasibility.kinematics() for the actual heading,
+# acceleration and yaw rate.
+TRAJECTORY_FIELDS = ('time_from_start', 'x', 'y', 'heading_rad', 'longitudinal_velocity_mps',
+    'acceleration_mps2', 'heading_rate_rps')
+
+# read/write access to one row of a (len(TRAJECTORY_FIELDS), n) column array
+def _column_property(field):
+    row = TRAJECTORY_FIELDS.index(field)
+
+    def get(self):
+        return self._columns[row]
+
+    def set(self, value):
+        self._columns[row] = value
+    return property(get, set)
+
+def _point_property(field):
+    row = TRAJECTORY_FIELDS.index(field)
+
+    def get(self):
+        return float(self._columns[row, self._index])
+
+    def set(self, value):
+        self._columns[row, self._index] = value
+    return property(get, set)
+
+# array-backed trajectory: every field is a contiguous column, points are views into them
+class Trajectory:
+    capacity = 100 # max. length in Trajectory.msg
+
+    def __init__(self, columns=None):
+        if columns is None:
+            columns = np.zeros((len(TRAJECTORY_FIELDS), 0))
+        columns = np.asarray(columns, dtype=np.float64)
+        if columns.ndim != 2 or columns.shape[0] != len(TRAJECTORY_FIELDS):
+            raise ValueError("expected columns of shape (%d, n), got %s"
+                % (len(TRAJECTORY_FIELDS), columns.shape))
+        self._columns = columns
+
+    @property
+    def columns(self):
+        return self._columns
+
+    # per-point access for callers written against the old list of TrajectoryPoint
+    @property
+    def points(self):
+        return self
+
+    def __len__(self):
+        return self._columns.shape[1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # slices share memory with the parent instead of copying it
+            return Trajectory(self._columns[:, index])
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("trajectory index out of range")
+        return TrajectoryPoint._view(self._columns, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TrajectoryPoint._view(self._columns, i)
+
+    # the next size points (Trajectory.capacity by default) from start, as a view; shorter
+    # near the end of the trajectory. time_from_start stays relative to the first point of
+    # the whole trajectory.
+    def window(self, start, size=None):
+        if size is None:
+            size = Trajectory.capacity
+        return self[start:start + size]
+
+    # Sliding horizon over a long trajectory: a window every step points, the last one
+    # ending at the last point. Every window is a view, nothing is copied or regenerated.
+    def windows(self, step=1, size=None):
+        if size is None:
+            size = Trajectory.capacity
+        if step < 1:
+            raise ValueError("step must be at least 1, got %r" % (step,))
+        start = 0
+        while True:
+            yield self.window(start, size)
+            if start + size >= len(self):
+                return
+            start = min(start + step, len(self) - size)
+
+    # cumulative distance travelled along x/y at every point, starting at 0
+    def arc_length(self):
+        return arc_length(self)
+
+    # spatial index for nearest point, projection and lookahead queries, see path_index.py;
+    # it copies x/y, so later changes to the trajectory need a new index
+    def path_index(self, cell_size=None):
+        return PathIndex(self, cell_size)
+
+    # points every spacing metres along the path, plus the last point; see resample()
+    def resample_by_distance(self, spacing, method='linear'):
+        end = self.arc_length()[-1]
+        return resample(self, 'distance', _with_end(np.arange(0.0, end, spacing), end), method)
+
+    # points every time_step seconds, plus the last point; see resample()
+    def resample_by_time(self, time_step, method='linear'):
+        end = self.time_from_start[-1]
+        return resample(self, 'time', _with_end(np.arange(0.0, end, time_step), end), method)
+
+    def __str__(self):
+        length = len(self.points)
+        
+        for i in range(0, length):
+            print(str(i) + ". ", end = '')
+            print(self.points[i])
+        
+        print(str(length) + " points")
+        ret = ''
+        return ret
+
+for _field in TRAJECTORY_FIELDS:
+    setattr(Trajectory, _field, _column_property(_field))
+
+# the columns of a Trajectory, or an array already shaped (..., fields, num_points) such as
+# a stack of trajectory columns, as float64
+def as_columns(trajectories):
+    if isinstance(trajectories, Trajectory):
+        return trajectories.columns
+    return np.asarray(trajectories, dtype=np.float64)
+
+class TrajectoryPoint:
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, time_from_start=0.0, x=0.0, y=0.0, heading_rad=0.0, 
+                 longitudinal_velocity_mps=0.0, acceleration_mps2=0.0, heading_rate_rps=0.0):
+        # time_from_start in seconds
+        self._columns = np.array([[time_from_start], [x], [y], [heading_rad],
+            [longitudinal_velocity_mps], [acceleration_mps2], [heading_rate_rps]], dtype=np.float64)
+        self._index = 0
+        # lateral_velocity_mps, front_wheel_angle_rad and rear_wheel_angle_rad are not modelled
+
+    # a point that reads and writes through to a trajectory's columns
+    @classmethod
+    def _view(cls, columns, index):
+        point = cls.__new__(cls)
+        point._columns = columns
+        point._index = index
+        return point
+
+    def __str__(self):
+        return "{:.3f}s ({:.3f}, {:.3f}), heading = {:.6f}rad, velocity = {:.2f}m/s {:.2f}km/h".format(
+            self.time_from_start, self.x, self.y, self.heading_rad, 
+            self.longitudinal_velocity_mps, to_kmph(self.longitudinal_velocity_mps))
+
+for _field in TRAJECTORY_FIELDS:
+    setattr(TrajectoryPoint, _field, _point_property(_field))
+
+# Resampling
+#
+# Interpolates every column of a trajectory at new stations along cumulative arc length
+# or time_from_start, so a trajectory generated at a coarse discretization can be
+# upsampled instead of regenerated. 'linear' interpolates each segment linearly (as
+# np.interp), 'cubic' uses cubic Hermite segments with finite-difference slopes, which
+# keeps the path and speed smooth across points. The heading is unwrapped first so it
+# never interpolates across the +-pi seam; the resampled heading stays continuous and can
+# leave [-pi, pi]. Stations outside the trajectory hold the first or last point.
+
+def arc_length(trajectory):
+    distance = np.zeros(len(trajectory))
+    np.cumsum(np.hypot(np.diff(trajectory.x), np.diff(trajectory.y)), out=distance[1:])
+    return distance
+
+def _with_end(stations, end):
+    if len(stations) == 0 or stations[-1] < end:
+        stations = np.append(stations, end)
+    return stations
+
+# Returns a new Trajectory with one point per station. by is 'distance' (stations in
+# metres of arc length) or 'time' (stations in seconds). Points that do not advance the
+# key, e.g. while standing still when resampling by time, are skipped; the first point
+# of such a run is kept.
+def resample(trajectory, by, stations, method='linear'):
+    if by == 'distance':
+        key = arc_length(trajectory)
+    elif by == 'time':
+        key = np.asarray(trajectory.time_from_start)
+    else:
+        raise ValueError("by must be 'distance' or 'time', got %r" % (by,))
+    if method not in ('linear', 'cubic'):
+        raise ValueError("method must be 'linear' or 'cubic', got %r" % (method,))
+    stations = np.asarray(stations, dtype=np.float64)
+    if len(trajectory) < 2:
+        return Trajectory(np.repeat(trajectory.columns, len(stations), axis=1))
+
+    advancing = np.ones(len(key), dtype=bool)
+    advancing[1:] = key[1:] > np.maximum.accumulate(key)[:-1]
+    key = key[advancing]
+    values = trajectory.columns[:, advancing]
+    # heading_rad holds radians(heading), so a full turn is radians(2 * pi) in its units
+    values[3] = np.unwrap(values[3], period=np.radians(2 * np.pi))
+    if len(key) < 2:
+        return Trajectory(np.repeat(values[:, :1], len(stations), axis=1))
+
+    segment = np.clip(np.searchsorted(key, stations, side='right') - 1, 0, len(key) - 2)
+    width = key[segment + 1] - key[segment]
+    t = np.clip((stations - key[segment]) / width, 0.0, 1.0)
+    start = values[:, segment]
+    end = values[:, segment + 1]
+    if method == 'linear':
+        columns = start + t * (end - start)
+    else:
+        slopes = np.gradient(values, key, axis=1)
+        t2 = t * t
+        t3 = t2 * t
+        columns = ((2 * t3 - 3 * t2 + 1) * start + (t3 - 2 * t2 + t) * width * slopes[:, segment]
+            + (-2 * t3 + 3 * t2) * end + (t3 - t2) * width * slopes[:, segment + 1])
+    # the key itself is exact at every station
+    if by == 'time':
+        columns[0] = np.clip(stations, key[0], key[-1])
+    return Trajectory(columns)
+
+# Vectorized trajectory engine
+#
+# Computes the same columns as the former per-point generation loop with whole-array
+# operations. Output matches that loop to within 1e-8 (seconds, metres, m/s), relative for
+# the long times of a crawl to a standstill; the only differences come from floating-point
+# summation order. check_engine.py checks this against a frozen copy of the loop. The
+# speed profile is solved in speed_profile.py.
+#
+# The kernels work on a batch: parameters are 1-D arrays of length n and profiles are
+# (n, num_points) arrays, so a single trajectory is just a batch of one.
+
+# running sum w_n = max(0, w_{n-1} + step_n) in closed form (Lindley recursion)
+def _lindley(start, steps):
+    total = np.cumsum(steps, axis=-1)
+    return total + np.maximum(start, -np.minimum.accumulate(total, axis=-1))
+
+# running sum of steps from start, clamped against a one-sided limit after every step
+def _clamped_cumsum(start, steps, limit=None, upper=False):
+    if limit is None:
+        return start + np.cumsum(steps, axis=-1)
+    if upper:
+        return limit - _lindley(limit - start, -steps)
+    return limit + _lindley(start - limit, steps)
+
+# heading_phases: sequence of (start_fraction, end_fraction, direction, limit). Within a
+# phase the heading moves by direction * heading_rate per point and stops at limit (None
+# for no limit); heading_rate grows by heading_rate_increments on every active point.
+# Returns the heading of shape (n, num_points).
+def heading_profile(num_points, heading_rate_increments, heading_rate_max, heading_phases):
+    heading_rate_increments = np.asarray(heading_rate_increments, dtype=np.float64).reshape(-1, 1)
+    heading_angle = np.zeros((heading_rate_increments.shape[0], num_points))
+    heading = np.zeros((heading_rate_increments.shape[0], 1))
+    active_points = 0
+    prev_end = 2
+    for start_fraction, end_fraction, direction, limit in heading_phases:
+        start = max(round(num_points * start_fraction), prev_end)
+        end = min(round(num_points * end_fraction), num_points + 1)
+        if end <= start:
+            continue
+        heading_angle[:, prev_end - 1:start - 1] = heading
+
+        heading_rate = np.arange(active_points, active_points + end - start) * heading_rate_increments
+        heading_rate = np.clip(heading_rate, -heading_rate_max, heading_rate_max)
+        phase = _clamped_cumsum(heading, direction * heading_rate, limit, upper=direction > 0)
+        heading_angle[:, start - 1:end - 1] = phase
+
+        heading = phase[:, -1:]
+        active_points += end - start
+        prev_end = end
+    heading_angle[:, prev_end - 1:] = heading
+    return heading_angle
+
+# fills heading_rad, longitudinal_velocity_mps, acceleration_mps2 and heading_rate_rps as
+# described at TRAJECTORY_FIELDS; heading is the heading in radians, (n, num_points) or
+# (num_points,)
+def _derived_columns(columns, seconds, speed, heading):
+    columns[:, 3] = np.radians(heading)
+    columns[:, 4] = speed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns[:, 5, 1:] = np.diff(speed, axis=-1) / seconds[:, 1:]
+        columns[:, 6, 1:] = np.diff(heading, axis=-1) / seconds[:, 1:]
+
+# returns trajectory columns of shape (n, len(TRAJECTORY_FIELDS), num_points), starting at
+# base_link; the parameters broadcast against each other. num_points_max defaults to
+# Trajectory.capacity, longer routes are coarsened to fit. math.inf lifts the limit, so a
+# long route can be generated once at full resolution and sent in windows.
+def _generate_columns(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments=0.15, speed_max=35.0,
+        stopping_decel=1.0, heading_rate_max=1.0, num_points_max=None):
+    if num_points_max is None:
+        num_points_max = Trajectory.capacity
+    num_points = int(length / discretization_m)
+    if num_points > num_points_max:
+        num_points = num_points_max
+        print("Only %d points available - discretization set to %s"
+            % (num_points_max, float(length / num_points_max))
+        )
+    discretization_distance_m = float(length / num_points)
+
+    initial_speed, final_speed, heading_rate_increments = (np.ravel(a) for a in
+        np.broadcast_arrays(initial_speed, final_speed, heading_rate_increments))
+    started = instrumentation.start()
+    seconds, speed = speed_profile(num_points, discretization_distance_m, initial_speed,
+        final_speed, speed_increments, speed_max, stopping_decel)
+    instrumentation.stop('generate.speed_profile', started)
+    started = instrumentation.start()
+    heading_angle = heading_profile(num_points, heading_rate_increments, heading_rate_max,
+        heading_phases)
+    instrumentation.stop('generate.heading_integration', started)
+
+    started = instrumentation.start()
+    columns = np.zeros((initial_speed.shape[0], len(TRAJECTORY_FIELDS), num_points))
+    columns[:, 0] = seconds
+    np.cumsum(discretization_m * np.cos(heading_angle[:, 1:]), axis=-1, out=columns[:, 1, 1:])
+    np.cumsum(discretization_m * np.sin(heading_angle[:, 1:]), axis=-1, out=columns[:, 2, 1:])
+    _derived_columns(columns, seconds, speed, heading_angle)
+    instrumentation.stop('generate.position_integration', started)
+    instrumentation.count('generate.trajectories', initial_speed.shape[0])
+    instrumentation.count('generate.points', initial_speed.shape[0] * num_points)
+    return columns
+
+# returns a Trajectory starting at base_link
+def generate_trajectory(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments=0.15, speed_max=35.0,
+        stopping_decel=1.0, heading_rate_max=1.0, num_points_max=None):
+    columns = _generate_columns(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments, speed_max, stopping_decel,
+        heading_rate_max, num_points_max)
+    return Trajectory(columns[0])
+
+# Generates one trajectory per parameter combination in a single batched pass. The
+# parameters broadcast against each other; the result has shape
+# (n, num_points, len(TRAJECTORY_FIELDS)). It is a view of (n, fields, num_points) storage,
+# so Trajectory(result[k].T) wraps a single trajectory without copying.
+def generate_trajectory_batch(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments=0.15, speed_max=35.0,
+        stopping_decel=1.0, heading_rate_max=1.0, num_points_max=None):
+    columns = _generate_columns(length, discretization_m, initial_speed, final_speed,
+        heading_rate_increments, heading_phases, speed_increments, speed_max, stopping_decel,
+        heading_rate_max, num_points_max)
+    return columns.swapaxes(1, 2)
+
+# Path backends
+#
+# Trajectories along a closed-form path from path_primitives.py instead of integrated
+# heading phases. The path is sampled at equal arc-length steps from its start to its end,
+# and the speed profile is the same accelerate / cruise / brake profile as above. The
+# derived columns are filled like those of the phase-based scenarios, see TRAJECTORY_FIELDS.
+
+# returns columns of shape (n, len(TRAJECTORY_FIELDS), num_points); the speeds broadcast
+def _generate_path_columns(path, discretization_m, initial_speed, final_speed,
+        speed_increments=0.15, speed_max=35.0, stopping_decel=1.0, num_points_max=None):
+    if num_points_max is None:
+        num_points_max = Trajectory.capacity
+    num_points = int(path.length / discretization_m) + 1
+    if num_points > num_points_max:
+        num_points = num_points_max
+        print("Only %d points available - discretization set to %s"
+            % (num_points_max, float(path.length / (num_points_max - 1)))
+        )
+    num_points = max(num_points, 2)
+    discretization_distance_m = path.length / (num_points - 1)
+
+    initial_speed, final_speed = (np.ravel(a) for a in
+        np.broadcast_arrays(initial_speed, final_speed))
+    started = instrumentation.start()
+    seconds, speed = speed_profile(num_points, discretization_distance_m, initial_speed,
+        final_speed, speed_increments, speed_max, stopping_decel)
+    instrumentation.stop('generate.speed_profile', started)
+    started = instrumentation.start()
+    x, y, heading, _ = path.evaluate(np.linspace(0.0, path.length, num_points))
+    instrumentation.stop('generate.path_evaluation', started)
+
+    columns = np.zeros((initial_speed.shape[0], len(TRAJECTORY_FIELDS), num_points))
+    columns[:, 0] = seconds
+    columns[:, 1] = x
+    columns[:, 2] = y
+    _derived_columns(columns, seconds, speed, heading)
+    instrumentation.count('generate.trajectories', initial_speed.shape[0])
+    instrumentation.count('generate.points', initial_speed.shape[0] * num_points)
+    return columns
+
+def generate_path_trajectory(path, discretization_m, initial_speed, final_speed,
+        speed_increments=0.15, speed_max=35.0, stopping_decel=1.0, num_points_max=None):
+    columns = _generate_path_columns(path, discretization_m, initial_speed, final_speed,
+        speed_increments, speed_max, stopping_decel, num_points_max)
+    return Trajectory(columns[0])
+
+# batched generate_path_trajectory(), shaped like generate_trajectory_batch()
+def generate_path_trajectory_batch(path, discretization_m, initial_speed, final_speed,
+        speed_increments=0.15, speed_max=35.0, stopping_decel=1.0, num_points_max=None):
+    columns = _generate_path_columns(path, discretization_m, initial_speed, final_speed,
+        speed_increments, speed_max, stopping_decel, num_points_max)
+    return columns.swapaxes(1, 2)
+
+# every combination of the given values, flattened to three equal-length arrays
+def parameter_grid(initial_speeds, final_speeds, heading_rate_increments):
+    grid = np.meshgrid(initial_speeds, final_speeds, heading_rate_increments, indexing='ij')
+    return tuple(g.ravel() for g in grid)
+
+# Declarative description of a manoeuvre. Every scenario is generated by the same
+# engine; they only differ in these parameters.
+#   heading_phases: see heading_profile()
+#   *_range: (valmin, valmax) of the tuning sliders
+#   num_points_max: see _generate_columns(), None for Trajectory.capacity
+#   path: a path_primitives path; when set it replaces length and heading_phases and
+#         heading_rate_increments has no effect
+#   xlim/ylim: plot limits
+#   csv_path: default export path of the tuner, None to skip exporting
+class Scenario:
+    def __init__(self, name, length=100.0, discretization_m=1.0, heading_phases=(),
+                 initial_speed=3.0, initial_speed_range=(0.0, 20.0),
+                 final_speed=3.0, final_speed_range=(0.0, 20.0),
+                 heading_rate_increments=0.0, heading_rate_increments_range=(0.0, 0.001),
+                 speed_increments=0.15, speed_max=35.0, stopping_decel=1.0, heading_rate_max=1.0,
+                 num_points_max=None, path=None, xlim=(-10, 120), ylim=(-20, 20), csv_path=None):
+        self.name = name
+        self.length = length
+        self.discretization_m = discretization_m
+        self.heading_phases = tuple(heading_phases)
+        self.initial_speed = initial_speed
+        self.initial_speed_range = initial_speed_range
+        self.final_speed = final_speed
+        self.final_speed_range = final_speed_range
+        self.heading_rate_increments = heading_rate_increments
+        self.heading_rate_increments_range = heading_rate_increments_range
+        self.speed_increments = speed_increments
+        self.speed_max = speed_max
+        self.stopping_decel = stopping_decel
+        self.heading_rate_max = heading_rate_max
+        self.num_points_max = num_points_max
+        self.path = path
+        if path is not None:
+            self.length = path.length
+        self.xlim = xlim
+        self.ylim = ylim
+        self.csv_path = csv_path
+
+    # slider parameters default to the scenario's own values
+    def generate(self, initial_speed=None, final_speed=None, heading_rate_increments=None):
+        if initial_speed is None:
+            initial_speed = self.initial_speed
+        if final_speed is None:
+            final_speed = self.final_speed
+        if heading_rate_increments is None:
+            heading_rate_increments = self.heading_rate_increments
+        if self.path is not None:
+            return generate_path_trajectory(self.path, self.discretization_m, initial_speed,
+                final_speed, self.speed_increments, self.speed_max, self.stopping_decel,
+                self.num_points_max)
+        return generate_trajectory(self.length, self.discretization_m, initial_speed, final_speed,
+            heading_rate_increments, self.heading_phases, self.speed_increments, self.speed_max,
+            self.stopping_decel, self.heading_rate_max, self.num_points_max)
+
+    # batched generate(); returns an (n, num_points, fields) array, see generate_trajectory_batch()
+    def generate_batch(self, initial_speed=None, final_speed=None, heading_rate_increments=None):
+        if initial_speed is None:
+            initial_speed = self.initial_speed
+        if final_speed is None:
+            final_speed = self.final_speed
+        if heading_rate_increments is None:
+            heading_rate_increments = self.heading_rate_increments
+        if self.path is not None:
+            # one trajectory per parameter set, even though the heading rate is unused
+            initial_speed, final_speed, _ = np.broadcast_arrays(initial_speed, final_speed,
+                heading_rate_increments)
+            return generate_path_trajectory_batch(self.path, self.discretization_m,
+                initial_speed, final_speed, self.speed_increments, self.speed_max,
+                self.stopping_decel, self.num_points_max)
+        return generate_trajectory_batch(self.length, self.discretization_m, initial_speed,
+            final_speed, heading_rate_increments, self.heading_phases, self.speed_increments,
+            self.speed_max, self.stopping_decel, self.heading_rate_max, self.num_points_max)
+
+    def __repr__(self):
+        return "Scenario(%r)" % self.name
+
+scenarios = {}
+
+def register_scenario(scenario):
+    if scenario.name in scenarios:
+        raise ValueError("scenario %r is already registered" % scenario.name)
+    scenarios[scenario.name] = scenario
+    return scenario
+
+def get_scenario(name):
+    try:
+        return scenarios[name]
+    except KeyError:
+        raise KeyError("unknown scenario %r, registered: %s"
+            % (name, ", ".join(sorted(scenarios)))) from None
+
+# steer right, then back until the heading is straight again
+LANE_CHANGE_PHASES = ((0.2, 0.6, -1, None), (0.6, 0.8, 1, 0.0))
+# steer right until the vehicle has turned by 90 degrees
+TURNING_PHASES = ((0.2, 0.8, -1, -1.5708),)
+
+# no steering, e.g. as a route segment between manoeuvres
+register_scenario(Scenario('straight'))
+
+register_scenario(Scenario('lane_change',
+    heading_phases=LANE_CHANGE_PHASES,
+    heading_rate_increments=0.00018, heading_rate_increments_range=(0.0001, 0.001),
+    csv_path='trajectories/lane_change_trajectory.csv'))
+
+register_scenario(Scenario('lane_change_discretization_pointfive',
+    length=50.0, discretization_m=0.5,
+    heading_phases=LANE_CHANGE_PHASES,
+    heading_rate_increments=0.00018, heading_rate_increments_range=(0.0001, 0.001),
+    csv_path='trajectories/lane_change_trajectory_discretization_pointfive.csv'))
+
+# higher curvature, lower speed than highway bend
+register_scenario(Scenario('junction_turning',
+    heading_phases=TURNING_PHASES,
+    heading_rate_increments=0.005, heading_rate_increments_range=(0.001, 0.005),
+    ylim=(-70, 5)))
+
+# lower curvature, higher speed than junction turning
+register_scenario(Scenario('highway_bend',
+    heading_phases=TURNING_PHASES,
+    initial_speed=14.0, final_speed=14.0,
+    heading_rate_increments=0.001, heading_rate_increments_range=(0.0005, 0.003),
+    ylim=(-70, 5)))
+
+# the same manoeuvres from closed-form paths, without curvature jumps
+register_scenario(Scenario('lane_change_quintic',
+    path=quintic_path(45.0, -3.5), discretization_m=0.5))
+
+register_scenario(Scenario('lane_change_clothoid',
+    path=clothoid_lane_change(-3.5, 45.0), discretization_m=0.5))
+
+register_scenario(Scenario('junction_turning_clothoid',
+    path=clothoid_turn(-math.pi / 2, 15.0), discretization_m=0.5,
+    ylim=(-70, 5)))
@@ -0,0 +1,128 @@
+import csv
+import io
+import os
+
+import numpy as np
+
+import instrumentation
+from trajectory_core import TRAJECTORY_FIELDS, Trajectory
+
+# Export of generated trajectories, kept apart from generation.
+#
+# CSV is the format the simulator reads: one trajectory per file, heading in degrees.
+# Rows are formatted in memory and written with a single write per trajectory.
+# For large sweeps the binary formats are much cheaper: .npy holds the raw
+# (fields, num_points) columns, .npz holds one named array per field, and
+# create_batch_memmap() gives a memory-mapped (n, num_points, fields) .npy that can be
+# filled incrementally and later opened with np.load(path, mmap_mode='r').
+
+# writing heading angle in degrees because Autoware's Heading requires conversion into Complex32 from degrees
+CSV_HEADER = ['time_from_start', "x", 'y', "heading_degrees", "longitudinal_velocity_mps",
+    'acceleration_mps2']
+
+def _csv_rows(trajectory):
+    rows = trajectory.columns[:6].T.copy()
+    rows[:, 3] = np.degrees(rows[:, 3])
+    return rows.tolist()
+
+def _makedirs_for(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def format_trajectory_csv(trajectory):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    writer.writerows(_csv_rows(trajectory))
+    return buffer.getvalue()
+
+@instrumentation.instrument('export.write_trajectory_csv')
+def write_trajectory_csv(path, trajectory):
+    text = format_trajectory_csv(trajectory)
+    _makedirs_for(path)
+    with open(path, 'w', newline='') as f:
+        f.write(text)
+
+# Streams many trajectories into one CSV, prefixed with a trajectory index column. Rows are
+# collected in memory and flushed in bulk once buffer_rows is exceeded.
+class TrajectoryCsvWriter:
+    def __init__(self, path, buffer_rows=65536):
+        _makedirs_for(path)
+        self.path = path
+        self.buffer_rows = buffer_rows
+        self.count = 0
+        self._file = open(path, 'w', newline='')
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._buffered_rows = 0
+        self._writer.writerow(['trajectory'] + CSV_HEADER)
+
+    def write(self, trajectory):
+        index = [self.count]
+        self._writer.writerows([index + row for row in _csv_rows(trajectory)])
+        self._buffered_rows += len(trajectory)
+        self.count += 1
+        if self._buffered_rows >= self.buffer_rows:
+            self.flush()
+
+    # trajectories: an (n, num_points, fields) array as returned by generate_trajectory_batch()
+    def write_batch(self, trajectories):
+        for columns in np.asarray(trajectories).swapaxes(1, 2):
+            self.write(Trajectory(columns))
+
+    def flush(self):
+        self._file.write(self._buffer.getvalue())
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffered_rows = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# export one trajectory, choosing the format from the extension (.csv, .npy or .npz)
+@instrumentation.instrument('export.save_trajectory')
+def save_trajectory(path, trajectory):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        write_trajectory_csv(path, trajectory)
+        return
+    _makedirs_for(path)
+    if extension == '.npy':
+        np.save(path, trajectory.columns)
+    elif extension == '.npz':
+        np.savez(path, **{field: getattr(trajectory, field) for field in TRAJECTORY_FIELDS})
+    else:
+        raise ValueError("unsupported trajectory format %r, expected .csv, .npy or .npz" % extension)
+
+# export an (n, num_points, fields) batch to .npy, or to .npz together with any extra arrays
+# (e.g. the sweep parameters)
+def save_batch(path, trajectories, **arrays):
+    extension = os.path.splitext(path)[1].lower()
+    _makedirs_for(path)
+    if extension == '.npy':
+        if arrays:
+            raise ValueError(".npy holds a single array, use .npz to store %s"
+                % ", ".join(sorted(arrays)))
+        np.save(path, trajectories)
+    elif extension == '.npz':
+        np.savez(path, trajectories=trajectories, **arrays)
+    else:
+        raise ValueError("unsupported batch format %r, expected .npy or .npz" % extension)
+
+def create_batch_memmap(path, num_trajectories, num_points):
+    _makedirs_for(path)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float64,
+        shape=(num_trajectories, num_points, len(TRAJECTORY_FIELDS)))
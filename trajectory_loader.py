@@ -0,0 +1,214 @@
+import argparse
+import fnmatch
+import io
+import os
+
+import numpy as np
+
+import instrumentation
+from trajectory_core import TRAJECTORY_FIELDS, Trajectory
+from trajectory_export import CSV_HEADER
+
+# Reading exported trajectories back, and comparing them.
+#
+# CSV files are parsed with a single np.loadtxt call straight into the column layout, with
+# heading_degrees converted back to heading_rad. heading_rate_rps is not exported and reads
+# as zero. load_directory() parses all CSV files of a directory in one call as well: the
+# files are read as bytes, their headers checked and stripped, and the bodies parsed
+# together, which is much faster than one call per file. .npy files are memory mapped
+# read-only, so loading a large batch costs nothing until it is accessed.
+#
+# compare() measures a candidate against a reference at equal arc length: every candidate
+# point is projected onto the reference path, and its lateral offset, speed and time are
+# compared with the reference interpolated at the projected arc length. Candidate points
+# beyond either end of the reference are compared with that end.
+
+_HEADER_LINE = ",".join(CSV_HEADER).encode()
+
+# the rows below the header, one per line: empty lines are dropped (np.loadtxt would skip
+# them), so the rows of a file can be counted by its newlines
+def _csv_body(data, path):
+    header, _, body = data.partition(b'\n')
+    if header.strip() != _HEADER_LINE:
+        raise ValueError("%s: unexpected CSV header %r" % (path, header.strip().decode()))
+    if b'\n\n' in body or body.startswith(b'\n') or b'\r' in body:
+        body = b'\n'.join(line for line in body.splitlines() if line.strip())
+    if body and not body.endswith(b'\n'):
+        body += b'\n'
+    return body
+
+def _parse_rows(body, num_fields=len(CSV_HEADER)):
+    if not body.strip():
+        return np.zeros((0, num_fields))
+    return np.loadtxt(io.BytesIO(body), delimiter=',', ndmin=2)
+
+# (n, 6) CSV rows to trajectory columns
+def _rows_to_columns(rows):
+    columns = np.zeros((len(TRAJECTORY_FIELDS), len(rows)))
+    columns[:6] = rows.T
+    columns[3] = np.radians(columns[3])
+    return columns
+
+@instrumentation.instrument('load.read_trajectory_csv')
+def read_trajectory_csv(path):
+    with open(path, 'rb') as f:
+        body = _csv_body(f.read(), path)
+    return Trajectory(_rows_to_columns(_parse_rows(body)))
+
+# the trajectories of a TrajectoryCsvWriter file, in the order they were written
+def read_trajectories_csv(path):
+    with open(path, 'rb') as f:
+        header, _, body = f.read().partition(b'\n')
+    if header.strip() != b'trajectory,' + _HEADER_LINE:
+        raise ValueError("%s: unexpected CSV header %r" % (path, header.strip().decode()))
+    rows = _parse_rows(body, len(CSV_HEADER) + 1)
+    starts = np.flatnonzero(np.diff(rows[:, 0], prepend=np.nan) != 0)
+    return [Trajectory(_rows_to_columns(part[:, 1:])) for part in np.split(rows, starts[1:])]
+
+# loads one trajectory saved by save_trajectory(), choosing the format from the extension;
+# .npy files are memory mapped read-only
+def load_trajectory(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_trajectory_csv(path)
+    if extension == '.npy':
+        return Trajectory(np.load(path, mmap_mode='r'))
+    if extension == '.npz':
+        with np.load(path) as data:
+            return Trajectory(np.array([data[field] for field in TRAJECTORY_FIELDS]))
+    raise ValueError("unsupported trajectory format %r, expected .csv, .npy or .npz" % extension)
+
+# loads an (n, num_points, fields) batch saved by save_batch() or create_batch_memmap();
+# returns (trajectories, extra arrays of an .npz)
+def load_batch(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return np.load(path, mmap_mode='r'), {}
+    if extension == '.npz':
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        return arrays.pop('trajectories'), arrays
+    raise ValueError("unsupported batch format %r, expected .npy or .npz" % extension)
+
+# {file name: Trajectory} of the files in directory matching pattern, sorted by name
+@instrumentation.instrument('load.load_directory')
+def load_directory(directory, pattern='*.csv'):
+    names = sorted(name for name in os.listdir(directory) if fnmatch.fnmatch(name, pattern))
+    trajectories = {}
+    csv_names, bodies = [], []
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.splitext(name)[1].lower() != '.csv':
+            trajectories[name] = load_trajectory(path)
+            continue
+        with open(path, 'rb') as f:
+            bodies.append(_csv_body(f.read(), path))
+        csv_names.append(name)
+
+    if csv_names:
+        counts = [body.count(b'\n') for body in bodies]
+        rows = _parse_rows(b''.join(bodies))
+        if len(rows) != sum(counts):
+            raise ValueError("%s: parsed %d rows from %d lines" % (directory, len(rows),
+                sum(counts)))
+        columns = _rows_to_columns(rows)
+        ends = np.cumsum(counts)
+        for name, start, end in zip(csv_names, ends - counts, ends):
+            trajectories[name] = Trajectory(columns[:, start:end])
+    return {name: trajectories[name] for name in names}
+
+# Differences of a candidate to a reference at equal arc length. Arrays are shaped like the
+# candidate's points: (num_points,) for a Trajectory, (n, num_points) for a batch; the
+# summaries reduce the last axis.
+#   lateral_deviation  signed distance from the reference path, positive left (m)
+#   speed_error        candidate minus reference speed (m/s)
+#   time_drift         candidate minus reference time_from_start (s)
+class TrajectoryDiff:
+    def __init__(self, arc_length, lateral_deviation, speed_error, time_drift):
+        self.arc_length = arc_length
+        self.lateral_deviation = lateral_deviation
+        self.speed_error = speed_error
+        self.time_drift = time_drift
+
+    @property
+    def max_lateral_deviation(self):
+        return np.abs(self.lateral_deviation).max(axis=-1)
+
+    @property
+    def rms_lateral_deviation(self):
+        return np.sqrt(np.mean(self.lateral_deviation ** 2, axis=-1))
+
+    @property
+    def max_speed_error(self):
+        return np.abs(self.speed_error).max(axis=-1)
+
+    @property
+    def rms_speed_error(self):
+        return np.sqrt(np.mean(self.speed_error ** 2, axis=-1))
+
+    @property
+    def final_time_drift(self):
+        return self.time_drift[..., -1]
+
+    @property
+    def max_time_drift(self):
+        return np.abs(self.time_drift).max(axis=-1)
+
+    def summary(self):
+        return {name: getattr(self, name) for name in ('max_lateral_deviation',
+            'rms_lateral_deviation', 'max_speed_error', 'rms_speed_error', 'final_time_drift',
+            'max_time_drift')}
+
+    def __str__(self):
+        return "\n".join("{:<22} {}".format(name, np.array2string(np.asarray(value),
+            precision=4)) for name, value in self.summary().items())
+
+# candidate: a Trajectory or an (n, num_points, fields) batch; index: the reference's
+# PathIndex, to reuse it across comparisons
+def compare(reference, candidate, index=None):
+    if index is None:
+        index = reference.path_index()
+    if isinstance(candidate, Trajectory):
+        columns = candidate.columns
+    else:
+        columns = np.moveaxis(np.asarray(candidate, dtype=np.float64), -1, -2)
+    projection = index.project(columns[..., 1, :], columns[..., 2, :])
+    arc_length = projection.arc_length
+    reference_speed = np.interp(arc_length, index.arc_length,
+        _padded(reference.longitudinal_velocity_mps))
+    reference_time = np.interp(arc_length, index.arc_length, _padded(reference.time_from_start))
+    return TrajectoryDiff(arc_length, projection.lateral_offset,
+        columns[..., 4, :] - reference_speed, columns[..., 0, :] - reference_time)
+
+# a single-point trajectory is indexed as two equal points
+def _padded(values):
+    values = np.asarray(values)
+    return np.repeat(values, 2) if len(values) == 1 else values
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare exported trajectories with a reference.")
+    parser.add_argument('reference', help="reference trajectory (.csv, .npy or .npz)")
+    parser.add_argument('candidates', nargs='+', help="trajectory files or directories of them")
+    parser.add_argument('--pattern', default='*.csv', help="file pattern within directories")
+    args = parser.parse_args(args)
+
+    reference = load_trajectory(args.reference)
+    index = reference.path_index()
+    print("{:<40} {:>7} {:>12} {:>12} {:>12}".format('candidate', 'points', 'max lat m',
+        'max dv m/s', 'drift s'))
+    for candidate in args.candidates:
+        if os.path.isdir(candidate):
+            loaded = {os.path.join(candidate, name): trajectory
+                for name, trajectory in load_directory(candidate, args.pattern).items()}
+        else:
+            loaded = {candidate: load_trajectory(candidate)}
+        for name, trajectory in loaded.items():
+            if len(trajectory) == 0:
+                print("{:<40} {:>7}".format(name, 0))
+                continue
+            diff = compare(reference, trajectory, index)
+            print("{:<40} {:>7} {:>12.4f} {:>12.4f} {:>12.4f}".format(name, len(trajectory),
+                diff.max_lateral_deviation, diff.max_speed_error, diff.final_time_drift))
+
+if __name__ == '__main__':
+    main()
@@ -1,56 +1,31 @@
-from tkinter.constants import N
-
+import argparse
 import math
-
-import matplotlib.pyplot as plt
-from matplotlib.widgets import Slider, Button
+import os
+from time import perf_counter
 
 import numpy as np
-from numpy.lib.arraypad import pad
-
-import csv
-
-def to_mps(kmph):
-    return (kmph * 1000)/3600
-
-def to_kmph(mps):
-    return (mps * 3600) / 1000
 
-class Trajectory:
-    capacity = 100 # max. length in Trajectory.msg
-
-    def __init__(self):
-        self.points = []
-
-    def __str__(self):
-        length = len(self.points)
-        
-        for i in range(0, length):
-            print(str(i) + ". ", end = '')
-            print(self.points[i])
-        
-        print(str(length) + " points")
-        ret = ''
-        return ret
-
-class TrajectoryPoint:
-    def __init__(self, time_from_start=0.0, x=0.0, y=0.0, heading_rad=0.0, 
-                 longitudinal_velocity_mps=0.0, acceleration_mps2=0.0):
-        self.time_from_start = time_from_start # seconds
-        self.x = x
-        self.y = y
-        self.heading_rad = heading_rad
-        self.longitudinal_velocity_mps = longitudinal_velocity_mps
-        # self.lateral_velocity_mps = 0.0
-        self.acceleration_mps2 = acceleration_mps2
-        # self.heading_rate_rps = 0.0
-        # self.front_wheel_angle_rad = front_wheel_angle_rad
-        # self.rear_wheel_angle_rad = 0.0
-
-    def __str__(self):
-        return "{:.3f}s ({:.3f}, {:.3f}), heading = {:.6f}rad, velocity = {:.2f}m/s {:.2f}km/h".format(
-            self.time_from_start, self.x, self.y, self.heading_rad, 
-            self.longitudinal_velocity_mps, to_kmph(self.longitudinal_velocity_mps))
+import instrumentation
+
+# everything that does not need a display lives in trajectory_core; it is re-exported here
+# for callers that import the generators from this module. matplotlib is only imported
+# once something is plotted.
+from trajectory_core import (TRAJECTORY_FIELDS, Trajectory, TrajectoryPoint, Scenario,
+    to_mps, to_kmph, speed_profile, heading_profile, generate_trajectory,
+    generate_trajectory_batch, parameter_grid, scenarios, register_scenario, get_scenario,
+    LANE_CHANGE_PHASES, TURNING_PHASES)
+from trajectory_export import write_trajectory_csv, save_trajectory
+from trajectory_cache import TrajectoryCache
+
+# scenario shown by main() and regenerated by the sliders
+active_scenario = 'lane_change_discretization_pointfive'
+# where every regenerated trajectory is exported (.csv, .npy or .npz); None uses the
+# scenario's csv_path, False disables exporting
+export_path = None
+# slider moves often revisit the same values, so regenerated trajectories are cached
+trajectory_cache = TrajectoryCache()
+# slider events are coalesced so the trajectory is regenerated at most once per frame
+frame_interval_s = 1.0 / 60
 
 # params for sliders generation
 initial_speed = None
@@ -63,462 +38,56 @@ heading_rate_increments = None
 heading_rate_increments_valmin = None
 heading_rate_increments_valmax = None
 
-def create_lane_change_trajectory():
-    f = open('trajectories/lane_change_trajectory.csv', 'w')
-    writer = csv.writer(f)
-    writer.writerow(['time_from_start', "x", 'y', "heading_degrees", "longitudinal_velocity_mps",
-        'acceleration_mps2'])
-    
-    # set params for plot
-    ax.set_ylim(-20, 20)
-    ax.set_xlim(-10, 120)
-
-    # set params for trajectory    
-    length = 100.0
-    discretization_m = 1.0
-    speed_increments = 0.15
-    speed_max = 35.0
-    stopping_decel = 1.0
-    heading_rate = 0.0
-    heading_rate_max = 1.0
+# generate a scenario with the slider params, initialising them from the scenario on first use
+def create_trajectory(name):
+    scenario = get_scenario(name)
 
     global heading_rate_increments, heading_rate_increments_valmin, heading_rate_increments_valmax
     if heading_rate_increments_valmin == None:
-        heading_rate_increments = 0.00018 # slider
-        heading_rate_increments_valmin = 0.0001
-        heading_rate_increments_valmax = 0.001
+        heading_rate_increments = scenario.heading_rate_increments # slider
+        heading_rate_increments_valmin, heading_rate_increments_valmax = scenario.heading_rate_increments_range
     global initial_speed, initial_speed_valmin, initial_speed_valmax
     if initial_speed == None:
-        initial_speed = 3.0 # slider
-        initial_speed_valmin = 0.0
-        initial_speed_valmax = 20.0
+        initial_speed = scenario.initial_speed # slider
+        initial_speed_valmin, initial_speed_valmax = scenario.initial_speed_range
     global final_speed, final_speed_valmin, final_speed_valmax
     if final_speed == None:
-        final_speed = 3.0 # slider
-        final_speed_valmin = 0.0
-        final_speed_valmax = 20.0
-
-    trajectory_msg = Trajectory()
-    
-    num_points_max = Trajectory.capacity
-    num_points = int(length / discretization_m)  
-    if num_points > num_points_max:
-        num_points = num_points_max
-        print("Only 100 points available - discretization set to %s"
-            % float(length / num_points_max)
-        )
-    discretization_distance_m = float(length / num_points)
-
-    # start at base_link
-    first_point = TrajectoryPoint(longitudinal_velocity_mps=initial_speed)
-    trajectory_msg.points.append(first_point)
-    # write into csv
-    writer.writerow([first_point.time_from_start, first_point.x, first_point.y, first_point.heading_rad, first_point.longitudinal_velocity_mps, first_point.acceleration_mps2])
-
-    decelerating = False
-    speed = first_point.longitudinal_velocity_mps
-    seconds = 0.0
-    if speed > 0:
-        seconds = float(discretization_distance_m / speed)
-    cur_x = first_point.x
-    cur_y = first_point.y
-    heading_angle = math.degrees(first_point.heading_rad)
-    prev_heading_angle = heading_angle
-    prev_speed = speed
-
-    for i in range(2, num_points + 1):
-        # update speed profile
-        if not decelerating:
-            speed += speed_increments
-            
-            next_speed = speed + speed_increments
-            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
-            predicted_stopping_distance = next_speed * predicted_stopping_time \
-                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
-            if ((num_points - i - 1) * discretization_distance_m) <= predicted_stopping_distance:
-                decelerating = True
-
-        speed = min(speed, speed_max)
-
-        if speed > 0:
-            seconds_delta = float(discretization_distance_m / speed)
-            seconds += seconds_delta
-            if decelerating:
-                speed -= stopping_decel * seconds_delta
-                speed = max(final_speed, speed)
-
-        # update heading
-        if i >= round(num_points * 0.2) and i < round(num_points * 0.6):
-            heading_angle -= heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-        elif i >= round(num_points * 0.6) and i < round(num_points * 0.8):
-            heading_angle += heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-            if heading_angle >= 0:
-                heading_angle = 0
-
-        # fillup trajectory point
-        trajectory_point = TrajectoryPoint()
-        trajectory_point.time_from_start = seconds
-
-        cur_x += discretization_m * np.cos(heading_angle)
-        cur_y += discretization_m * np.sin(heading_angle)
-        trajectory_point.x = cur_x
-        trajectory_point.y = cur_y
-        
-        trajectory_point.heading_rad = math.radians(heading_angle)
-        trajectory_point.longitudinal_velocity_mps = float(speed)
-        trajectory_point.acceleration_mps2 = (speed - prev_speed) / seconds
-        trajectory_point.heading_rate_rps = (heading_angle - prev_heading_angle) / seconds
+        final_speed = scenario.final_speed # slider
+        final_speed_valmin, final_speed_valmax = scenario.final_speed_range
 
-        trajectory_msg.points.append(trajectory_point)
-        # write into csv
-        # writing heading angle in degrees because Autoware's Heading requires conversion into Complex32 from degrees
-        writer.writerow([trajectory_point.time_from_start, trajectory_point.x, trajectory_point.y, heading_angle, trajectory_point.longitudinal_velocity_mps, trajectory_point.acceleration_mps2])
+    trajectory = trajectory_cache.get(scenario, initial_speed, final_speed, heading_rate_increments)
+    path = scenario.csv_path if export_path is None else export_path
+    if path:
+        save_trajectory(path, trajectory)
+    return trajectory
 
-        prev_heading_angle = heading_angle
-        prev_speed = speed
-
-    f.close()
-    return trajectory_msg     
+def create_lane_change_trajectory():
+    return create_trajectory('lane_change')
 
 def create_lane_change_trajectory_discretization_pointfive():
-    f = open('/home/han/adehome/AutowareAuto/src/control/ros_simulator/src/trajectories/lane_change_trajectory_discretization_pointfive.csv', 'w')
-    writer = csv.writer(f)
-    writer.writerow(['time_from_start', "x", 'y', "heading_degrees", "longitudinal_velocity_mps",
-        'acceleration_mps2'])
-    
-    # set params for plot
-    ax.set_ylim(-20, 20)
-    ax.set_xlim(-10, 120)
-
-    # set params for trajectory    
-    length = 50.0
-    discretization_m = 0.5
-    speed_increments = 0.15
-    speed_max = 35.0
-    stopping_decel = 1.0
-    heading_rate = 0.0
-    heading_rate_max = 1.0
-
-    global heading_rate_increments, heading_rate_increments_valmin, heading_rate_increments_valmax
-    if heading_rate_increments_valmin == None:
-        heading_rate_increments = 0.00018 # slider
-        heading_rate_increments_valmin = 0.0001
-        heading_rate_increments_valmax = 0.001
-    global initial_speed, initial_speed_valmin, initial_speed_valmax
-    if initial_speed == None:
-        initial_speed = 3.0 # slider
-        initial_speed_valmin = 0.0
-        initial_speed_valmax = 20.0
-    global final_speed, final_speed_valmin, final_speed_valmax
-    if final_speed == None:
-        final_speed = 3.0 # slider
-        final_speed_valmin = 0.0
-        final_speed_valmax = 20.0
+    return create_trajectory('lane_change_discretization_pointfive')
 
-    trajectory_msg = Trajectory()
-    
-    num_points_max = Trajectory.capacity
-    num_points = int(length / discretization_m)  
-    if num_points > num_points_max:
-        num_points = num_points_max
-        print("Only 100 points available - discretization set to %s"
-            % float(length / num_points_max)
-        )
-    discretization_distance_m = float(length / num_points)
-
-    # start at base_link
-    first_point = TrajectoryPoint(longitudinal_velocity_mps=initial_speed)
-    trajectory_msg.points.append(first_point)
-    # write into csv
-    writer.writerow([first_point.time_from_start, first_point.x, first_point.y, first_point.heading_rad, first_point.longitudinal_velocity_mps, first_point.acceleration_mps2])
-
-    decelerating = False
-    speed = first_point.longitudinal_velocity_mps
-    seconds = 0.0
-    if speed > 0:
-        seconds = float(discretization_distance_m / speed)
-    cur_x = first_point.x
-    cur_y = first_point.y
-    heading_angle = math.degrees(first_point.heading_rad)
-    prev_heading_angle = heading_angle
-    prev_speed = speed
-
-    for i in range(2, num_points + 1):
-        # update speed profile
-        if not decelerating:
-            speed += speed_increments
-            
-            next_speed = speed + speed_increments
-            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
-            predicted_stopping_distance = next_speed * predicted_stopping_time \
-                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
-            if ((num_points - i - 1) * discretization_distance_m) <= predicted_stopping_distance:
-                decelerating = True
-
-        speed = min(speed, speed_max)
-
-        if speed > 0:
-            seconds_delta = float(discretization_distance_m / speed)
-            seconds += seconds_delta
-            if decelerating:
-                speed -= stopping_decel * seconds_delta
-                speed = max(final_speed, speed)
-
-        # update heading
-        if i >= round(num_points * 0.2) and i < round(num_points * 0.6):
-            heading_angle -= heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-        elif i >= round(num_points * 0.6) and i < round(num_points * 0.8):
-            heading_angle += heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-            if heading_angle >= 0:
-                heading_angle = 0
-
-        # fillup trajectory point
-        trajectory_point = TrajectoryPoint()
-        trajectory_point.time_from_start = seconds
-
-        cur_x += discretization_m * np.cos(heading_angle)
-        cur_y += discretization_m * np.sin(heading_angle)
-        trajectory_point.x = cur_x
-        trajectory_point.y = cur_y
-        
-        trajectory_point.heading_rad = math.radians(heading_angle)
-        trajectory_point.longitudinal_velocity_mps = float(speed)
-        trajectory_point.acceleration_mps2 = (speed - prev_speed) / seconds
-        trajectory_point.heading_rate_rps = (heading_angle - prev_heading_angle) / seconds
-
-        trajectory_msg.points.append(trajectory_point)
-        # write into csv
-        # writing heading angle in degrees because Autoware's Heading requires conversion into Complex32 from degrees
-        writer.writerow([trajectory_point.time_from_start, trajectory_point.x, trajectory_point.y, heading_angle, trajectory_point.longitudinal_velocity_mps, trajectory_point.acceleration_mps2])
-
-        prev_heading_angle = heading_angle
-        prev_speed = speed
-
-    f.close()
-    return trajectory_msg  
-# higher curvature, lower speed than highway bend
 def create_junction_turning_trajectory():
-    # set params for plot
-    ax.set_ylim(-70, 5)
-    ax.set_xlim(-10, 120)
-
-    # set params for trajectory    
-    length = 100.0
-    discretization_m = 1.0
-    speed_increments = 0.15
-    speed_max = 35.0
-    stopping_decel = 1.0
-    heading_rate = 0.0
-    heading_rate_max = 1.0
-
-    global heading_rate_increments, heading_rate_increments_valmin, heading_rate_increments_valmax
-    if heading_rate_increments_valmin == None:
-        heading_rate_increments = 0.005 # slider
-        heading_rate_increments_valmin = 0.001
-        heading_rate_increments_valmax = 0.005
-    global initial_speed, initial_speed_valmin, initial_speed_valmax
-    if initial_speed == None:
-        initial_speed = 3.0 # slider
-        initial_speed_valmin = 0.0
-        initial_speed_valmax = 20.0
-    global final_speed, final_speed_valmin, final_speed_valmax
-    if final_speed == None:
-        final_speed = 3.0 # slider
-        final_speed_valmin = 0.0
-        final_speed_valmax = 20.0
+    return create_trajectory('junction_turning')
 
-    trajectory_msg = Trajectory()
-    
-    num_points_max = Trajectory.capacity
-    num_points = int(length / discretization_m)  
-    if num_points > num_points_max:
-        num_points = num_points_max
-        print("Only 100 points available - discretization set to %s"
-            % float(length / num_points_max)
-        )
-    discretization_distance_m = float(length / num_points)
-
-    # start at base_link
-    first_point = TrajectoryPoint(longitudinal_velocity_mps=initial_speed)
-    trajectory_msg.points.append(first_point)
-
-    decelerating = False
-    speed = first_point.longitudinal_velocity_mps
-    seconds = 0.0
-    if speed > 0:
-        seconds = float(discretization_distance_m / speed)
-    cur_x = first_point.x
-    cur_y = first_point.y
-    heading_angle = math.degrees(first_point.heading_rad)
-    prev_heading_angle = heading_angle
-    prev_speed = speed
-
-    for i in range(2, num_points + 1):
-        # update speed profile
-        if not decelerating:
-            speed += speed_increments
-            
-            next_speed = speed + speed_increments
-            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
-            predicted_stopping_distance = next_speed * predicted_stopping_time \
-                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
-            if ((num_points - i - 1) * discretization_distance_m) <= predicted_stopping_distance:
-                decelerating = True
-
-        speed = min(speed, speed_max)
-
-        if speed > 0:
-            seconds_delta = float(discretization_distance_m / speed)
-            seconds += seconds_delta
-            if decelerating:
-                speed -= stopping_decel * seconds_delta
-                speed = max(final_speed, speed)
-
-        # update heading
-        if i >= round(num_points * 0.2) and i < round(num_points * 0.8):
-            heading_angle -= heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-            if heading_angle < -1.5708:
-                heading_angle = -1.5708
-            
-
-        # fillup trajectory point
-        trajectory_point = TrajectoryPoint()
-        trajectory_point.time_from_start = seconds
-
-        cur_x += discretization_m * np.cos(heading_angle)
-        cur_y += discretization_m * np.sin(heading_angle)
-        trajectory_point.x = cur_x
-        trajectory_point.y = cur_y
-        
-        trajectory_point.heading_rad = math.radians(heading_angle)
-        trajectory_point.longitudinal_velocity_mps = float(speed)
-        trajectory_point.acceleration_mps2 = (speed - prev_speed) / seconds
-        trajectory_point.heading_rate_rps = (heading_angle - prev_heading_angle) / seconds
-
-        trajectory_msg.points.append(trajectory_point)
-        prev_heading_angle = heading_angle
-        prev_speed = speed
-
-    return trajectory_msg
-
-# lower curvature, higher speed than junction turning
 def create_highway_bend_trajectory():
-    # set params for plot
-    ax.set_ylim(-70, 5)
-    ax.set_xlim(-10, 120)
-
-    # set params for trajectory    
-    length = 100.0
-    discretization_m = 1.0
-    speed_increments = 0.15
-    speed_max = 35.0
-    stopping_decel = 1.0
-    heading_rate = 0.0
-    heading_rate_max = 1.0
+    return create_trajectory('highway_bend')
 
-    global heading_rate_increments, heading_rate_increments_valmin, heading_rate_increments_valmax
-    if heading_rate_increments_valmin == None:
-        heading_rate_increments = 0.001 # slider
-        heading_rate_increments_valmin = 0.0005
-        heading_rate_increments_valmax = 0.003
-    global initial_speed, initial_speed_valmin, initial_speed_valmax
-    if initial_speed == None:
-        initial_speed = 14.0 # slider
-        initial_speed_valmin = 0.0
-        initial_speed_valmax = 20.0
-    global final_speed, final_speed_valmin, final_speed_valmax
-    if final_speed == None:
-        final_speed = 14.0 # slider
-        final_speed_valmin = 0.0
-        final_speed_valmax = 20.0
+# the figure is only created once something is plotted, so the generators can be
+# imported by processes that never open a window
+fig = None
+ax = None
+annotation = None
+# the tuner's sliders by parameter name ('initial_speed', 'final_speed',
+# 'heading_rate_increments', 'index'), so scripts can drive them
+sliders = {}
 
-    trajectory_msg = Trajectory()
-    
-    num_points_max = Trajectory.capacity
-    num_points = int(length / discretization_m)  
-    if num_points > num_points_max:
-        num_points = num_points_max
-        print("Only 100 points available - discretization set to %s"
-            % float(length / num_points_max)
-        )
-    discretization_distance_m = float(length / num_points)
-
-    # start at base_link
-    first_point = TrajectoryPoint(longitudinal_velocity_mps=initial_speed)
-    trajectory_msg.points.append(first_point)
-
-    decelerating = False
-    speed = first_point.longitudinal_velocity_mps
-    seconds = 0.0
-    if speed > 0:
-        seconds = float(discretization_distance_m / speed)
-    cur_x = first_point.x
-    cur_y = first_point.y
-    heading_angle = math.degrees(first_point.heading_rad)
-    prev_heading_angle = heading_angle
-    prev_speed = speed
-
-    for i in range(2, num_points + 1):
-        # update speed profile
-        if not decelerating:
-            speed += speed_increments
-            
-            next_speed = speed + speed_increments
-            predicted_stopping_time = (next_speed - final_speed) / stopping_decel
-            predicted_stopping_distance = next_speed * predicted_stopping_time \
-                - 0.5 * stopping_decel * predicted_stopping_time * predicted_stopping_time
-            if ((num_points - i - 1) * discretization_distance_m) <= predicted_stopping_distance:
-                decelerating = True
-
-        speed = min(speed, speed_max)
-
-        if speed > 0:
-            seconds_delta = float(discretization_distance_m / speed)
-            seconds += seconds_delta
-            if decelerating:
-                speed -= stopping_decel * seconds_delta
-                speed = max(final_speed, speed)
-
-        # update heading
-        if i >= round(num_points * 0.2) and i < round(num_points * 0.8):
-            heading_angle -= heading_rate
-            heading_rate += heading_rate_increments
-            heading_rate = max(-heading_rate_max, min(heading_rate_max, heading_rate))
-            if heading_angle < -1.5708:
-                heading_angle = -1.5708
-            
-
-        # fillup trajectory point
-        trajectory_point = TrajectoryPoint()
-        trajectory_point.time_from_start = seconds
-
-        cur_x += discretization_m * np.cos(heading_angle)
-        cur_y += discretization_m * np.sin(heading_angle)
-        trajectory_point.x = cur_x
-        trajectory_point.y = cur_y
-        
-        trajectory_point.heading_rad = math.radians(heading_angle)
-        trajectory_point.longitudinal_velocity_mps = float(speed)
-        trajectory_point.acceleration_mps2 = (speed - prev_speed) / seconds
-        trajectory_point.heading_rate_rps = (heading_angle - prev_heading_angle) / seconds
+def create_figure():
+    import matplotlib.pyplot as plt
 
-        trajectory_msg.points.append(trajectory_point)
-        prev_heading_angle = heading_angle
-        prev_speed = speed
-
-    return trajectory_msg
-
-fig, ax = plt.subplots()
+    global fig, ax, annotation
+    fig, ax = plt.subplots()
+    annotation = create_annotation()
 
 # annotation template to display index, time and velocity of waypoints 
 def create_annotation():
@@ -529,33 +98,37 @@ def create_annotation():
         arrowprops=dict(arrowstyle="->"))
     annotation.set_visible(False)
     return annotation
-annotation = create_annotation()
 
-x = []
-y = []
-vel = []
-vel_kmph = []
-time = []
-heading = []
+x = np.zeros(0)
+y = np.zeros(0)
+vel = np.zeros(0)
+vel_kmph = np.zeros(0)
+time = np.zeros(0)
+heading = np.zeros(0)
 
-def plot_trajectory(trajectory):
+# point the plotted arrays at the trajectory's columns, no per-point copies
+def set_plot_arrays(trajectory):
     global x, y, vel, vel_kmph, time, heading
-    
-    for i in range(0, len(trajectory.points)):
-        point = trajectory.points[i]
-        x.append(point.x)
-        y.append(point.y)
-        vel.append(point.longitudinal_velocity_mps)
-        vel_kmph.append(to_kmph(point.longitudinal_velocity_mps))
-        time.append(point.time_from_start)
-        heading.append(point.heading_rad)
-    
-    x = np.array(x)
-    y = np.array(y)
-    vel = np.array(vel)
-    vel_kmph = np.array(vel_kmph)
-    time = np.array(time)
-    heading = np.array(heading)
+    x = trajectory.x
+    y = trajectory.y
+    vel = trajectory.longitudinal_velocity_mps
+    vel_kmph = to_kmph(vel)
+    time = trajectory.time_from_start
+    heading = trajectory.heading_rad
+
+def plot_trajectory(trajectory, scenario=None):
+    import matplotlib.pyplot as plt
+    from matplotlib.widgets import Slider, Button
+
+    if fig is None:
+        create_figure()
+    set_plot_arrays(trajectory)
+
+    # set params for plot
+    if scenario is None:
+        scenario = get_scenario(active_scenario)
+    ax.set_ylim(*scenario.ylim)
+    ax.set_xlim(*scenario.xlim)
 
     fig.set_size_inches(18, 14)
 
@@ -575,7 +148,36 @@ def plot_trajectory(trajectory):
     ax.set_xlabel('Longitudinal Position X/m')
     ax.set_ylabel("Lateral Position Y/m")
     ax.set_title('Planned Trajectory')
-    
+
+    # Everything that changes while tuning is animated: a full draw skips it and leaves a
+    # static background, which is cached after every full draw (startup, resize, zoom).
+    # Updates then restore that background and redraw only the animated artists.
+    animated = [sc, line, annotation]
+    for artist in animated:
+        artist.set_animated(True)
+    background = None
+
+    def on_draw(event):
+        nonlocal background
+        if fig.canvas.supports_blit:
+            background = fig.canvas.copy_from_bbox(fig.bbox)
+        draw_animated(event.renderer)
+
+    def draw_animated(renderer=None):
+        if renderer is None:
+            renderer = fig.canvas.get_renderer()
+        for artist in animated:
+            artist.draw(renderer)
+
+    def blit():
+        if background is None:
+            fig.canvas.draw_idle()
+            return
+        fig.canvas.restore_region(background)
+        draw_animated()
+        fig.canvas.blit(fig.bbox)
+
+    @instrumentation.instrument('gui.hover')
     def hover(event):
         def update_annotation(ind):
             index = ind["ind"][0]
@@ -592,11 +194,11 @@ def plot_trajectory(trajectory):
             if cont:
                 update_annotation(ind)
                 annotation.set_visible(True)
-                fig.canvas.draw_idle()
+                blit()
             else:
                 if is_visible:
                     annotation.set_visible(False)
-                    fig.canvas.draw_idle()
+                    blit()
     
     axcolor = 'lightgoldenrodyellow'
 
@@ -658,74 +260,110 @@ def plot_trajectory(trajectory):
 
     button.on_clicked(reset)
 
+    # the sliders are redrawn with the other animated artists instead of each requesting a
+    # full redraw when its value changes
+    for slider in (initial_speed_slider, final_speed_slider, heading_slider, index_slider):
+        slider.drawon = False
+        slider.ax.set_animated(True)
+        animated.append(slider.ax)
+
     # function to be called when the index slider moves
     def update_index_plot(val):
         idx = round(index_slider.val)
         endx, endy = apply_waypoint_heading(idx)
         line.set_xdata([x[idx], endx])
         line.set_ydata([y[idx], endy])
+        blit()
     
     # function to be called when the trajectory params' sliders move
-    def update_trajectory_plot(val):
-        global initial_speed, final_speed, heading_rate_increments, x, y, vel, vel_kmph, time, heading
+    @instrumentation.instrument('gui.update_trajectory_plot')
+    def update_trajectory_plot():
+        global initial_speed, final_speed, heading_rate_increments
+        nonlocal last_update
+        last_update = perf_counter()
         initial_speed = to_mps(initial_speed_slider.val)
         final_speed = to_mps(final_speed_slider.val)
         heading_rate_increments = heading_slider.val
 
         new_trajectory = get_trajectory()
         # print(new_trajectory)
-        new_trajectory_len = len(new_trajectory.points)
-        xy = []
-        for i in range(0, new_trajectory_len):
-            point = new_trajectory.points[i]
-            
-            # mutate the arrays when the trajectory was initially plotted
-            x[i] = point.x
-            y[i] = point.y
-            vel[i] = point.longitudinal_velocity_mps
-            vel_kmph[i] = to_kmph(point.longitudinal_velocity_mps)
-            time[i] = point.time_from_start
-            heading[i] = point.heading_rad
-            
-            xy.append((point.x, point.y))
-        
-        # some points from the original trajectory will not be overwritten
-        if new_trajectory_len < len(trajectory.points):
-            x = x[:new_trajectory_len]
-            y = y[:new_trajectory_len]
-            vel = vel[:new_trajectory_len]
-            vel_kmph = vel_kmph[:new_trajectory_len]
-            time = time[:new_trajectory_len]
-            heading = heading[:new_trajectory_len]
+        set_plot_arrays(new_trajectory)
 
         # Update length of slider when new trajectory has different # points
         index_slider.set_valmax = len(x) - 1
 
+        sc.set_offsets(new_trajectory.columns[1:3].T)
+        sc.set_array(vel_kmph)
         # when the trajectory changes, the index plot will always change too
         update_index_plot(index_slider.val)
-        sc.set_offsets(xy)
-        sc.set_cmap("copper_r")
-        fig.canvas.draw_idle()
-    
-    initial_speed_slider.on_changed(update_trajectory_plot)
-    final_speed_slider.on_changed(update_trajectory_plot)
-    heading_slider.on_changed(update_trajectory_plot)
+
+    # A slider drag fires far more events than frames. The first event after a quiet
+    # frame regenerates right away; later ones only start a timer for the end of the
+    # frame, which then regenerates once from the latest slider values.
+    last_update = -math.inf
+    pending = False
+    timer = fig.canvas.new_timer()
+    timer.single_shot = True
+
+    def on_timer():
+        nonlocal pending
+        pending = False
+        update_trajectory_plot()
+
+    timer.add_callback(on_timer)
+
+    def schedule_trajectory_update(val):
+        nonlocal pending
+        instrumentation.count('gui.slider_events')
+        wait = last_update + frame_interval_s - perf_counter()
+        if wait <= 0 and not pending:
+            update_trajectory_plot()
+        elif not pending:
+            pending = True
+            timer.interval = max(1, int(wait * 1000))
+            timer.start()
+
+    initial_speed_slider.on_changed(schedule_trajectory_update)
+    final_speed_slider.on_changed(schedule_trajectory_update)
+    heading_slider.on_changed(schedule_trajectory_update)
     index_slider.on_changed(update_index_plot)
+    sliders.update(initial_speed=initial_speed_slider, final_speed=final_speed_slider,
+        heading_rate_increments=heading_slider, index=index_slider)
 
+    fig.canvas.mpl_connect("draw_event", on_draw)
     fig.canvas.mpl_connect("motion_notify_event", hover)
     # adjust the main plot to make room for the sliders
     plt.subplots_adjust(left=0.25, bottom=0.25, right=1.04)
     plt.show()
 
 def get_trajectory():
-    # return create_lane_change_trajectory()
-    return create_lane_change_trajectory_discretization_pointfive()
-    # return create_junction_turning_trajectory()
-    # return create_highway_bend_trajectory()
+    return create_trajectory(active_scenario)
 
 def main(args=None):
+    global active_scenario, export_path
+    parser = argparse.ArgumentParser(description="Interactively tune a trajectory scenario.")
+    parser.add_argument('--scenario', default=active_scenario, choices=sorted(scenarios))
+    parser.add_argument('--export-path', default=None,
+        help="export every regenerated trajectory here (.csv, .npy or .npz), "
+             "e.g. into the simulator's trajectories directory")
+    parser.add_argument('--no-export', action='store_true')
+    parser.add_argument('--cache-size', type=int, default=trajectory_cache.maxsize)
+    parser.add_argument('--cache-file', default=None,
+        help="load cached trajectories from this .npz on start and save them on exit")
+    args = parser.parse_args(args)
+    active_scenario = args.scenario
+    export_path = False if args.no_export else args.export_path
+    trajectory_cache.maxsize = args.cache_size
+    if args.cache_file is not None and os.path.exists(args.cache_file):
+        trajectory_cache.load(args.cache_file)
+
     # print(get_trajectory())
     plot_trajectory(get_trajectory())
 
+    if args.cache_file is not None:
+        trajectory_cache.save(args.cache_file)
+    if instrumentation.enabled:
+        print(instrumentation.report())
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,492 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+
+import instrumentation
+from instrumentation import LatencyHistogram
+from trajectory_core import TRAJECTORY_FIELDS, Trajectory, get_scenario
+
+# Serves generated trajectories over a local socket (a Unix socket, or TCP on localhost).
+#
+# Every message is a frame: two big-endian uint32 lengths, a JSON header and a binary
+# payload. Trajectories travel as their raw float64 (fields, num_points) columns, so the
+# receiver wraps them without parsing. Requests (JSON header, no payload):
+#   {"type": "get", "id": 1, "scenario": "lane_change", "initial_speed": 5.0, ...}
+#   {"type": "subscribe", "id": 2, "scenario": ..., "rate_hz": 10.0, ...}
+#   {"type": "unsubscribe", "id": 2}
+# Missing parameters take the scenario's values. Replies are {"type": "trajectory", "id",
+# "scenario", "num_points", "sequence", "stamp"} headers with the columns as payload, or
+# {"type": "error", "id", "message"}. A subscription publishes the trajectory at rate_hz
+# (capped at max_rate_hz) until it is cancelled; subscribing again with the same id
+# replaces it.
+#
+# Requests from all connections are generated in batches: the batcher collects them for up
+# to batch_window_s (or max_batch requests) and generates every scenario's share with one
+# generate_batch() call off the event loop.
+#
+# Backpressure: a connection has at most max_pending replies queued or in generation.
+# Beyond that the server stops reading its requests, so a client that sends faster than it
+# reads is slowed down by the socket itself. A subscription never queues more than one
+# frame; ticks that find the previous frame unsent are dropped and counted, so a slow
+# consumer always gets the latest trajectory instead of a growing backlog.
+
+_FRAME = struct.Struct('!II')
+MAX_HEADER_BYTES = 64 * 1024
+PARAMETERS = ('initial_speed', 'final_speed', 'heading_rate_increments')
+
+def encode_frame(header, payload=b''):
+    data = json.dumps(header).encode()
+    return _FRAME.pack(len(data), len(payload)) + data + payload
+
+# a frame that cannot be skipped, so the rest of the stream cannot be read
+class FrameError(ValueError):
+    pass
+
+# Returns (header, payload); raises asyncio.IncompleteReadError at the end of the stream,
+# FrameError for an oversized header and ValueError for a header that is not a JSON
+# object. After a ValueError the frame has been consumed and the next one can be read.
+async def read_frame(reader):
+    header_size, payload_size = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if header_size > MAX_HEADER_BYTES:
+        raise FrameError("frame header of %d bytes exceeds %d" % (header_size, MAX_HEADER_BYTES))
+    data = await reader.readexactly(header_size)
+    payload = await reader.readexactly(payload_size) if payload_size else b''
+    header = json.loads(data)
+    if not isinstance(header, dict):
+        raise ValueError("frame header must be a JSON object, got %s" % type(header).__name__)
+    return header, payload
+
+# wraps a trajectory frame's payload without copying; the columns are read-only
+def frame_trajectory(header, payload):
+    columns = np.frombuffer(payload, dtype=np.float64)
+    return Trajectory(columns.reshape(len(TRAJECTORY_FIELDS), header['num_points']))
+
+class _Subscription:
+    def __init__(self, request_id, scenario, params, period):
+        self.request_id = request_id
+        self.scenario = scenario
+        self.params = params
+        self.period = period
+        self.pending = False
+        self.sequence = 0
+        self.dropped = 0
+        self.task = None
+
+class TrajectoryServer:
+    # send_buffer_bytes sets the sockets' kernel send buffer (None keeps the system default);
+    # a small one makes a slow subscriber drop frames sooner instead of reading old ones
+    def __init__(self, max_batch=64, batch_window_s=0.001, max_pending=16, max_rate_hz=100.0,
+            send_buffer_bytes=None):
+        self.max_batch = max_batch
+        self.batch_window_s = batch_window_s
+        self.max_pending = max_pending
+        self.max_rate_hz = max_rate_hz
+        self.send_buffer_bytes = send_buffer_bytes
+        self.requests = 0
+        self.batches = 0
+        self.dropped = 0
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._connections = {}
+        self.address = None
+
+    # listens on the Unix socket path, or on TCP host:port (port 0 picks a free one)
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run_batcher())
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._handle, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def close(self):
+        self._server.close()
+        # closing the transports ends the handlers through end of stream; cancelling them
+        # makes asyncio log the cancellation as an error
+        for writer in self._connections.values():
+            writer.close()
+        if self._connections:
+            _, pending = await asyncio.wait(list(self._connections), timeout=1.0)
+            for task in pending:
+                task.cancel()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    # columns payload of the scenario's trajectory for params, generated by the batcher
+    async def generate(self, scenario, params):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((scenario, params, future))
+        return await future
+
+    async def _run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[0].name, []).append(request)
+            for requests in groups.values():
+                try:
+                    payloads = await loop.run_in_executor(None, self._generate_group, requests)
+                except Exception as e:
+                    for _, _, future in requests:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), payload in zip(requests, payloads):
+                    if not future.done():
+                        future.set_result(payload)
+            self.batches += 1
+
+    @instrumentation.instrument('server.generate_batch')
+    def _generate_group(self, requests):
+        scenario = requests[0][0]
+        params = np.array([request[1] for request in requests], dtype=np.float64)
+        batch = scenario.generate_batch(params[:, 0], params[:, 1], params[:, 2])
+        instrumentation.count('server.generated', len(requests))
+        return [(batch.shape[1], np.ascontiguousarray(columns.T).tobytes()) for columns in batch]
+
+    def _parse(self, header):
+        scenario = get_scenario(header['scenario'])
+        params = tuple(float(header[name]) if header.get(name) is not None
+            else float(getattr(scenario, name)) for name in PARAMETERS)
+        for name, value in zip(PARAMETERS, params):
+            if not math.isfinite(value):
+                raise ValueError("%s must be finite, got %r" % (name, value))
+        return scenario, params
+
+    async def _handle(self, reader, writer):
+        connection = asyncio.current_task()
+        self._connections[connection] = writer
+        if self.send_buffer_bytes is not None:
+            writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                self.send_buffer_bytes)
+            writer.transport.set_write_buffer_limits(self.send_buffer_bytes)
+        outgoing = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_pending)
+        subscriptions = {}
+        tasks = set()
+        sender = asyncio.ensure_future(self._send(writer, outgoing, slots))
+        try:
+            while True:
+                try:
+                    header, _ = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except FrameError as e:
+                    # the stream is out of step: report and close, after queued replies
+                    await outgoing.put((encode_frame({'type': 'error', 'id': None,
+                        'message': str(e)}), None))
+                    await outgoing.put((None, None))
+                    await sender
+                    break
+                except ValueError as e:
+                    await outgoing.put((encode_frame({'type': 'error', 'id': None,
+                        'message': str(e)}), None))
+                    continue
+                request_id = header.get('id')
+                kind = header.get('type')
+                if not isinstance(request_id, (int, float, str, type(None))):
+                    await outgoing.put((encode_frame({'type': 'error', 'id': None,
+                        'message': "id must be a number or a string"}), None))
+                    continue
+                if kind == 'unsubscribe':
+                    subscription = subscriptions.pop(request_id, None)
+                    if subscription is not None:
+                        subscription.task.cancel()
+                    continue
+                # stop reading while max_pending replies are outstanding
+                await slots.acquire()
+                try:
+                    scenario, params = self._parse(header)
+                    if kind == 'get':
+                        task = asyncio.ensure_future(self._reply(request_id, scenario, params,
+                            outgoing, slots))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        continue
+                    if kind != 'subscribe':
+                        raise ValueError("unknown request type %r" % (kind,))
+                    rate_hz = min(float(header.get('rate_hz', 10.0)), self.max_rate_hz)
+                    if not rate_hz > 0:
+                        raise ValueError("rate_hz must be positive, got %r" % (rate_hz,))
+                except (KeyError, ValueError, TypeError) as e:
+                    message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+                    await outgoing.put((encode_frame({'type': 'error', 'id': request_id,
+                        'message': message}), slots))
+                    continue
+                slots.release()
+                previous = subscriptions.pop(request_id, None)
+                if previous is not None:
+                    previous.task.cancel()
+                subscription = _Subscription(request_id, scenario, params, 1.0 / rate_hz)
+                subscription.task = asyncio.ensure_future(self._publish(subscription, outgoing))
+                subscriptions[request_id] = subscription
+        finally:
+            for task in list(tasks) + [s.task for s in subscriptions.values()]:
+                task.cancel()
+            sender.cancel()
+            writer.close()
+            self._connections.pop(connection, None)
+
+    async def _reply(self, request_id, scenario, params, outgoing, slots):
+        self.requests += 1
+        instrumentation.count('server.requests')
+        try:
+            num_points, payload = await self.generate(scenario, params)
+        except Exception as e:
+            await outgoing.put((encode_frame({'type': 'error', 'id': request_id,
+                'message': str(e)}), slots))
+            return
+        await outgoing.put((encode_frame({'type': 'trajectory', 'id': request_id,
+            'scenario': scenario.name, 'num_points': num_points, 'sequence': 0,
+            'stamp': time.time()}, payload), slots))
+
+    async def _publish(self, subscription, outgoing):
+        loop = asyncio.get_running_loop()
+        num_points, payload = await self.generate(subscription.scenario, subscription.params)
+        next_tick = loop.time()
+        while True:
+            if subscription.pending:
+                subscription.dropped += 1
+                self.dropped += 1
+                instrumentation.count('server.dropped_frames')
+            else:
+                subscription.pending = True
+                await outgoing.put((encode_frame({'type': 'trajectory',
+                    'id': subscription.request_id, 'scenario': subscription.scenario.name,
+                    'num_points': num_points, 'sequence': subscription.sequence,
+                    'stamp': time.time()}, payload), subscription))
+                subscription.sequence += 1
+            # skip ticks that were missed entirely instead of bursting to catch up
+            next_tick = max(next_tick + subscription.period, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+    # writes queued frames until a None frame or a closed connection
+    async def _send(self, writer, outgoing, slots):
+        while True:
+            frame, owner = await outgoing.get()
+            if frame is None:
+                return
+            writer.write(frame)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                return
+            if isinstance(owner, _Subscription):
+                owner.pending = False
+            elif owner is not None:
+                owner.release()
+
+# Client standing in for the planner / simulator side: requests trajectories, subscribes to
+# streams and records the latency of every reply (request to reply for get(), publication
+# stamp to arrival for streams). processing_delay_s makes it a slow consumer; consumers can
+# share one latency histogram.
+class FakeConsumer:
+    def __init__(self, processing_delay_s=0.0, latency=None):
+        self.processing_delay_s = processing_delay_s
+        self.latency = LatencyHistogram() if latency is None else latency
+        self.received = 0
+        self._reader = None
+        self._writer = None
+        self._receiver = None
+        self._next_id = 1
+        self._waiting = {}
+        self._streams = {}
+
+    # read_buffer_bytes bounds what the client buffers before it stops reading the socket
+    async def connect(self, address, read_buffer_bytes=2 ** 16):
+        if isinstance(address, str):
+            self._reader, self._writer = await asyncio.open_unix_connection(address,
+                limit=read_buffer_bytes)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(*address,
+                limit=read_buffer_bytes)
+        self._receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        self._writer.close()
+        self._receiver.cancel()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _receive(self):
+        while True:
+            try:
+                header, payload = await read_frame(self._reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            arrived = time.time()
+            request_id = header.get('id')
+            if header['type'] == 'error':
+                result = ValueError(header['message'])
+            else:
+                self.received += 1
+                result = frame_trajectory(header, payload)
+            if request_id in self._waiting:
+                future, sent = self._waiting.pop(request_id)
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    self.latency.record(time.perf_counter() - sent)
+                    future.set_result(result)
+            elif request_id in self._streams:
+                if not isinstance(result, Exception):
+                    self.latency.record(max(arrived - header['stamp'], 0.0))
+                await self._streams[request_id].put(result)
+            if self.processing_delay_s:
+                await asyncio.sleep(self.processing_delay_s)
+        for future, _ in self._waiting.values():
+            if not future.done():
+                future.set_exception(ConnectionError("server closed the connection"))
+
+    def _request_id(self):
+        request_id = self._next_id
+        self._next_id += 1
+        return request_id
+
+    async def get(self, scenario, **params):
+        request_id = self._request_id()
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = (future, time.perf_counter())
+        self._writer.write(encode_frame(dict(params, type='get', id=request_id,
+            scenario=scenario)))
+        await self._writer.drain()
+        return await future
+
+    # requests (param dicts with a 'scenario') pipelined on the one connection, with at most
+    # window of them in flight
+    async def get_many(self, requests, window=8):
+        in_flight = asyncio.Semaphore(window)
+
+        async def get(request):
+            async with in_flight:
+                return await self.get(**request)
+        return await asyncio.gather(*(get(request) for request in requests))
+
+    # yields count trajectories published at rate_hz, then unsubscribes
+    async def subscribe(self, scenario, rate_hz, count, **params):
+        request_id = self._request_id()
+        queue = self._streams[request_id] = asyncio.Queue()
+        self._writer.write(encode_frame(dict(params, type='subscribe', id=request_id,
+            scenario=scenario, rate_hz=rate_hz)))
+        await self._writer.drain()
+        try:
+            for _ in range(count):
+                result = await queue.get()
+                if isinstance(result, Exception):
+                    raise result
+                yield result
+        finally:
+            del self._streams[request_id]
+            self._writer.write(encode_frame({'type': 'unsubscribe', 'id': request_id}))
+
+def _print_latency(label, histogram):
+    s = histogram.summary()
+    print("{}: {} replies, mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms".format(
+        label, s['count'], s['mean_s'] * 1e3, s['p50_s'] * 1e3, s['p99_s'] * 1e3,
+        s['max_s'] * 1e3))
+
+async def _bench(args):
+    server = await TrajectoryServer(max_batch=args.max_batch,
+        send_buffer_bytes=args.send_buffer).start(args.socket)
+    latency = LatencyHistogram()
+    consumers = [await FakeConsumer(latency=latency).connect(server.address)
+        for _ in range(args.consumers)]
+    scenario = get_scenario(args.scenario)
+    low, high = scenario.heading_rate_increments_range
+    started = time.perf_counter()
+    await asyncio.gather(*(consumer.get_many([{'scenario': args.scenario,
+        'heading_rate_increments': value} for value in np.linspace(low, high, args.requests)],
+        args.window) for consumer in consumers))
+    elapsed = time.perf_counter() - started
+    total = args.requests * args.consumers
+    print("{} requests in {:.3f}s ({:,.0f}/s), {} batches".format(total, elapsed,
+        total / elapsed, server.batches))
+    _print_latency("get", latency)
+
+    stream = FakeConsumer(processing_delay_s=args.slow)
+    await stream.connect(server.address, read_buffer_bytes=8192)
+    async for _ in stream.subscribe(args.scenario, args.rate, max(int(args.rate), 1)):
+        pass
+    _print_latency("subscribe {:g} Hz".format(args.rate), stream.latency)
+    print("dropped {} frames for a consumer taking {:g} ms per frame".format(server.dropped,
+        args.slow * 1e3))
+    for consumer in consumers + [stream]:
+        await consumer.close()
+    await server.close()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Serve generated trajectories over a local socket.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve = subparsers.add_parser('serve', help="run the server")
+    serve.add_argument('--socket', help="Unix socket path; TCP on localhost when omitted")
+    serve.add_argument('--port', type=int, default=0)
+    serve.add_argument('--max-batch', type=int, default=64)
+    serve.add_argument('--max-pending', type=int, default=16)
+    serve.add_argument('--max-rate', type=float, default=100.0)
+    serve.add_argument('--send-buffer', type=int, help="socket send buffer in bytes")
+    bench = subparsers.add_parser('bench', help="measure latency against an in-process server")
+    bench.add_argument('--socket', help="Unix socket path; TCP on localhost when omitted")
+    bench.add_argument('--scenario', default='lane_change')
+    bench.add_argument('--consumers', type=int, default=4)
+    bench.add_argument('--requests', type=int, default=500, help="requests per consumer")
+    bench.add_argument('--window', type=int, default=8, help="requests in flight per consumer")
+    bench.add_argument('--max-batch', type=int, default=64)
+    bench.add_argument('--rate', type=float, default=50.0, help="subscription rate in Hz")
+    bench.add_argument('--send-buffer', type=int, default=16384,
+        help="server socket send buffer in bytes")
+    bench.add_argument('--slow', type=float, default=0.0,
+        help="seconds the subscribing consumer spends per frame")
+    args = parser.parse_args(args)
+
+    if args.command == 'bench':
+        asyncio.run(_bench(args))
+        return 0
+
+    async def serve_forever():
+        server = await TrajectoryServer(args.max_batch, max_pending=args.max_pending,
+            max_rate_hz=args.max_rate, send_buffer_bytes=args.send_buffer).start(args.socket,
+            port=args.port)
+        print("serving on {}".format(server.address), file=sys.stderr)
+        await server.serve_forever()
+    try:
+        asyncio.run(serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
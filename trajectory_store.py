@@ -0,0 +1,152 @@
+import os
+import warnings
+
+import numpy as np
+
+from trajectory_core import TRAJECTORY_FIELDS, Trajectory
+
+# On-disk library of generated trajectories.
+#
+# records.bin holds fixed-width float64 records of shape (fields, capacity), one per
+# trajectory, and is read through numpy.memmap; a trajectory returned by get() is a view
+# into that mapping, so reads never copy. index.npz maps (scenario, initial_speed,
+# final_speed, heading_rate_increments) to the record offset and the number of valid points,
+# and records the layout of records.bin (fields and capacity) and how many of its records
+# the index covers. A store can only be reopened with the layout it was written with.
+# Appends go to the end of records.bin; the index is rewritten on flush(), close() and when
+# the store is garbage collected. Records appended after the last flush that made it to
+# disk are unreachable, which is warned about when the store is opened. Appending an
+# existing key points the index at the new record and leaves the old one unreferenced.
+
+INDEX_DTYPE = np.dtype([('scenario', 'U64'), ('initial_speed', '<f8'), ('final_speed', '<f8'),
+    ('heading_rate_increments', '<f8'), ('offset', '<i8'), ('length', '<i8')])
+
+# parameters are matched to 12 significant digits so values that went through
+# float formatting or np.linspace still find their record
+def _key(scenario, initial_speed, final_speed, heading_rate_increments):
+    return (scenario, float('%.12g' % initial_speed), float('%.12g' % final_speed),
+        float('%.12g' % heading_rate_increments))
+
+class TrajectoryStore:
+    # capacity defaults to the capacity the store was created with, Trajectory.capacity for
+    # a new one
+    def __init__(self, directory, capacity=None):
+        self.directory = directory
+        self._records_path = os.path.join(directory, "records.bin")
+        self._index_path = os.path.join(directory, "index.npz")
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+
+        self._index = {}
+        indexed_records = 0
+        if os.path.exists(self._index_path):
+            with np.load(self._index_path) as data:
+                fields = tuple(str(field) for field in data['fields'])
+                stored_capacity = int(data['capacity'])
+                indexed_records = int(data['num_records'])
+                entries = data['index']
+            if fields != TRAJECTORY_FIELDS:
+                raise ValueError("%s holds records of fields %s, expected %s"
+                    % (directory, fields, TRAJECTORY_FIELDS))
+            if capacity is not None and capacity != stored_capacity:
+                raise ValueError("%s holds records of capacity %d, not %d"
+                    % (directory, stored_capacity, capacity))
+            capacity = stored_capacity
+            for entry in entries:
+                key = _key(str(entry['scenario']), entry['initial_speed'], entry['final_speed'],
+                    entry['heading_rate_increments'])
+                self._index[key] = (int(entry['offset']), int(entry['length']))
+        elif os.path.exists(self._records_path) and os.path.getsize(self._records_path):
+            raise ValueError("%s has records but no index, its layout is unknown" % directory)
+        if capacity is None:
+            capacity = Trajectory.capacity
+        self.capacity = capacity
+        self._record_shape = (len(TRAJECTORY_FIELDS), capacity)
+        self._record_bytes = 8 * len(TRAJECTORY_FIELDS) * capacity
+
+        self._num_records = 0
+        if os.path.exists(self._records_path):
+            self._num_records = os.path.getsize(self._records_path) // self._record_bytes
+        if self._num_records > indexed_records:
+            warnings.warn("%s: %d records were appended after the last flush and are not "
+                "indexed" % (directory, self._num_records - indexed_records))
+        self._mapped = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return _key(*key) in self._index
+
+    def keys(self):
+        return list(self._index)
+
+    # the whole file as an (n, fields, capacity) read-only mapping, remapped after appends
+    def _records(self):
+        if self._mapped is None or self._mapped.shape[0] != self._num_records:
+            if self._num_records == 0:
+                return np.zeros((0,) + self._record_shape)
+            self._mapped = np.memmap(self._records_path, dtype='<f8', mode='r',
+                shape=(self._num_records,) + self._record_shape)
+        return self._mapped
+
+    def get(self, scenario, initial_speed, final_speed, heading_rate_increments):
+        offset, length = self._index[_key(scenario, initial_speed, final_speed,
+            heading_rate_increments)]
+        return Trajectory(self._records()[offset, :, :length])
+
+    def append(self, scenario, initial_speed, final_speed, heading_rate_increments, trajectory):
+        self._append(scenario, [initial_speed], [final_speed], [heading_rate_increments],
+            trajectory.columns[None])
+
+    # trajectories: an (n, num_points, fields) array as returned by generate_trajectory_batch()
+    def append_batch(self, scenario, initial_speed, final_speed, heading_rate_increments,
+            trajectories):
+        initial_speed, final_speed, heading_rate_increments = (np.ravel(a) for a in
+            np.broadcast_arrays(initial_speed, final_speed, heading_rate_increments))
+        self._append(scenario, initial_speed, final_speed, heading_rate_increments,
+            np.asarray(trajectories).swapaxes(1, 2))
+
+    # columns: (n, fields, num_points)
+    def _append(self, scenario, initial_speed, final_speed, heading_rate_increments, columns):
+        count, _, length = columns.shape
+        if length > self.capacity:
+            raise ValueError("trajectories have %d points, the store holds at most %d"
+                % (length, self.capacity))
+        if len(initial_speed) != count:
+            raise ValueError("got %d parameter sets for %d trajectories" % (len(initial_speed), count))
+
+        records = np.zeros((count,) + self._record_shape, dtype='<f8')
+        records[:, :, :length] = columns
+        with open(self._records_path, 'ab') as f:
+            records.tofile(f)
+
+        for i in range(count):
+            key = _key(scenario, initial_speed[i], final_speed[i], heading_rate_increments[i])
+            self._index[key] = (self._num_records + i, length)
+        self._num_records += count
+        self._dirty = True
+
+    def flush(self):
+        if not self._dirty:
+            return
+        index = np.array([key + value for key, value in self._index.items()], dtype=INDEX_DTYPE)
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, index=index, fields=np.array(TRAJECTORY_FIELDS),
+                capacity=self.capacity, num_records=self._num_records)
+        os.replace(tmp_path, self._index_path)
+        self._dirty = False
+
+    def close(self):
+        self.flush()
+        self._mapped = None
+
+    def __del__(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
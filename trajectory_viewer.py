@@ -0,0 +1,254 @@
+import argparse
+import math
+import os
+
+import numpy as np
+
+import instrumentation
+from path_index import PointIndex
+from trajectory_core import Trajectory, get_scenario, parameter_grid, to_kmph
+
+# Viewer for many trajectories at once: loaded runs, sweep results or long routes.
+#
+# All trajectories are drawn as one LineCollection colored by velocity, instead of one
+# scatter marker per point. What goes into it depends on the view and is recomputed when
+# the axes limits change:
+#   - level of detail: level k keeps every 2**k-th point of each trajectory (and its last
+#     point). The level is the lowest one whose point spacing is at least
+#     min_pixel_spacing pixels on screen, raised further while more than max_segments
+#     segments would be visible.
+#   - culling: trajectories whose bounding box misses the view are skipped, and so are
+#     segments whose bounding box does.
+#   - when even the coarsest level exceeds max_segments (thousands of overlapping sweep
+#     results), only every stride-th trajectory is drawn, doubling the stride until the
+#     rest fits.
+# Hovering finds the closest point through a PointIndex over every point of every
+# trajectory at full resolution, and the annotation is blitted over a cached background.
+
+class TrajectoryViewer:
+    # trajectories: Trajectory objects or an (n, num_points, fields) batch
+    def __init__(self, trajectories, labels=None, ax=None, min_pixel_spacing=2.0,
+            max_segments=10000, hover_radius_px=6.0):
+        if isinstance(trajectories, np.ndarray):
+            columns = list(np.moveaxis(trajectories, -1, -2))
+        else:
+            columns = [t.columns for t in trajectories]
+        columns = [c for c in columns if c.shape[1] > 0]
+        if not columns:
+            raise ValueError("no trajectories to show")
+        self.labels = list(labels) if labels is not None else [str(i) for i in range(len(columns))]
+        self.min_pixel_spacing = min_pixel_spacing
+        self.max_segments = max_segments
+        self.hover_radius_px = hover_radius_px
+
+        lengths = np.array([c.shape[1] for c in columns])
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self.lengths = lengths
+        data = np.concatenate(columns, axis=1)
+        self.time, self.x, self.y = data[0], data[1], data[2]
+        self.speed = data[4]
+        self.owner = np.repeat(np.arange(len(columns)), lengths)
+        self.local_index = np.arange(len(self.x)) - self.starts[self.owner]
+        self.bounds = np.array([np.minimum.reduceat(self.x, self.starts),
+            np.minimum.reduceat(self.y, self.starts), np.maximum.reduceat(self.x, self.starts),
+            np.maximum.reduceat(self.y, self.starts)])
+
+        step = np.hypot(np.diff(self.x), np.diff(self.y))
+        step = step[(self.owner[1:] == self.owner[:-1]) & (step > 0)]
+        self.spacing = float(np.median(step)) if len(step) else 1.0
+        self.max_step = float(step.max()) if len(step) else 1.0
+        # from here on every trajectory is down to its first and last point
+        self.max_level = max(int(lengths.max()) - 1, 1).bit_length()
+        self._levels = {}
+        self._point_index = None
+        self._view = None
+        self.level = 0
+        self.stride = 1
+
+        self.ax = ax
+        self.collection = None
+        self.annotation = None
+        self._background = None
+
+    # indices of the points kept at level
+    def level_points(self, level):
+        points = self._levels.get(level)
+        if points is None:
+            last = self.local_index == self.lengths[self.owner] - 1
+            points = np.flatnonzero((self.local_index % (1 << level) == 0) | last)
+            self._levels[level] = points
+        return points
+
+    # level of detail for a view spanning metres_per_pixel, before the segment budget
+    def choose_level(self, metres_per_pixel):
+        if self.spacing <= 0:
+            return 0
+        return max(0, math.ceil(math.log2(self.min_pixel_spacing * metres_per_pixel
+            / self.spacing)))
+
+    # (segments (m, 2, 2), velocity km/h per segment) within the given limits spanning
+    # width x height pixels
+    def segments(self, xlim, ylim, width, height):
+        visible = ((self.bounds[2] >= xlim[0]) & (self.bounds[0] <= xlim[1])
+            & (self.bounds[3] >= ylim[0]) & (self.bounds[1] <= ylim[1]))
+        level = self.choose_level(max((xlim[1] - xlim[0]) / width, (ylim[1] - ylim[0]) / height))
+        stride = 1
+        while True:
+            points = self.level_points(level)
+            owner = self.owner[points]
+            points = points[visible[owner] & (owner % stride == 0)]
+            x, y = self.x[points], self.y[points]
+            keep = ((self.owner[points[:-1]] == self.owner[points[1:]])
+                & (np.minimum(x[:-1], x[1:]) <= xlim[1]) & (np.maximum(x[:-1], x[1:]) >= xlim[0])
+                & (np.minimum(y[:-1], y[1:]) <= ylim[1]) & (np.maximum(y[:-1], y[1:]) >= ylim[0]))
+            if np.count_nonzero(keep) <= self.max_segments:
+                break
+            if level < self.max_level:
+                level += 1
+            else:
+                stride *= 2
+        self.level = level
+        self.stride = stride
+        first, second = points[:-1][keep], points[1:][keep]
+        segments = np.empty((len(first), 2, 2))
+        segments[:, 0, 0], segments[:, 0, 1] = self.x[first], self.y[first]
+        segments[:, 1, 0], segments[:, 1, 1] = self.x[second], self.y[second]
+        return segments, to_kmph(self.speed[first])
+
+    # ax: passed by the axes limit callbacks, always self.ax
+    @instrumentation.instrument('viewer.update_view')
+    def update_view(self, ax=None):
+        xlim, ylim = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+        width, height = max(self.ax.bbox.width, 1.0), max(self.ax.bbox.height, 1.0)
+        view = (tuple(xlim), tuple(ylim), width, height)
+        if view == self._view:
+            return
+        self._view = view
+        segments, velocity = self.segments(xlim, ylim, width, height)
+        self.collection.set_segments(segments)
+        self.collection.set_array(velocity)
+        instrumentation.count('viewer.segments', len(segments))
+
+    # closest point to (x, y) within hover_radius_px on screen, or None
+    def point_at(self, x, y):
+        if self._point_index is None:
+            self._point_index = PointIndex(self.x, self.y)
+        index, _ = self._point_index.nearest(x, y)
+        screen = self.ax.transData.transform([[self.x[index], self.y[index]], [x, y]])
+        if np.hypot(*(screen[0] - screen[1])) > self.hover_radius_px:
+            return None
+        return int(index)
+
+    def show(self, title='Trajectories'):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        if self.ax is None:
+            _, self.ax = plt.subplots(figsize=(18, 14))
+        ax = self.ax
+        fig = ax.figure
+        self.collection = LineCollection([], cmap="copper_r", linewidths=1.0)
+        self.collection.set_clim(0, 100)
+        ax.add_collection(self.collection)
+        margin = 0.05 * max(np.ptp(self.x), np.ptp(self.y), 1.0)
+        ax.set_xlim(self.x.min() - margin, self.x.max() + margin)
+        ax.set_ylim(self.y.min() - margin, self.y.max() + margin)
+        cbar = fig.colorbar(self.collection, ax=ax, pad=0.02)
+        cbar.set_label("Vel km/h", rotation=360, labelpad=30)
+        ax.set_xlabel('Longitudinal Position X/m')
+        ax.set_ylabel("Lateral Position Y/m")
+        ax.set_title(title)
+
+        self.annotation = ax.annotate("", xy=(0, 0), xytext=(-10, 30),
+            textcoords="offset points", bbox=dict(boxstyle="round", fc="cyan", alpha=0.4),
+            arrowprops=dict(arrowstyle="->"))
+        self.annotation.set_visible(False)
+        self.annotation.set_animated(True)
+        self.update_view()
+
+        ax.callbacks.connect('xlim_changed', self.update_view)
+        ax.callbacks.connect('ylim_changed', self.update_view)
+        fig.canvas.mpl_connect('resize_event', lambda event: self.update_view())
+        fig.canvas.mpl_connect('draw_event', self._on_draw)
+        fig.canvas.mpl_connect('motion_notify_event', self.hover)
+        return fig
+
+    def _on_draw(self, event):
+        if self.ax.figure.canvas.supports_blit:
+            self._background = self.ax.figure.canvas.copy_from_bbox(self.ax.figure.bbox)
+        self.annotation.draw(event.renderer)
+
+    def _blit(self):
+        canvas = self.ax.figure.canvas
+        if self._background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self._background)
+        self.annotation.draw(canvas.get_renderer())
+        canvas.blit(self.ax.figure.bbox)
+
+    @instrumentation.instrument('viewer.hover')
+    def hover(self, event):
+        index = None
+        if event.inaxes == self.ax and event.xdata is not None:
+            index = self.point_at(event.xdata, event.ydata)
+        if index is None:
+            if self.annotation.get_visible():
+                self.annotation.set_visible(False)
+                self._blit()
+            return
+        owner = self.owner[index]
+        self.annotation.xy = (self.x[index], self.y[index])
+        self.annotation.set_text("{} #{}\n({:.3f},{:.3f})\nTimestamp: {:.3f}s \nVelocity: {:.2f}m/s {:.2f}km/h".format(
+            self.labels[owner], self.local_index[index], self.x[index], self.y[index],
+            self.time[index], self.speed[index], to_kmph(self.speed[index])))
+        self.annotation.set_visible(True)
+        self._blit()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="View many trajectories at once.")
+    parser.add_argument('paths', nargs='*', help="trajectory files or directories of them")
+    parser.add_argument('--pattern', default='*.csv', help="file pattern within directories")
+    parser.add_argument('--scenario', help="also show a parameter sweep of this scenario")
+    parser.add_argument('--sweep', type=int, default=10,
+        help="values per parameter of the sweep over the slider ranges")
+    parser.add_argument('--save', help="render to this image file instead of opening a window")
+    args = parser.parse_args(args)
+
+    import matplotlib
+    if args.save:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from trajectory_loader import load_directory, load_trajectory
+
+    trajectories, labels = [], []
+    for path in args.paths:
+        if os.path.isdir(path):
+            loaded = load_directory(path, args.pattern)
+        else:
+            loaded = {path: load_trajectory(path)}
+        for name, trajectory in loaded.items():
+            trajectories.append(trajectory)
+            labels.append(name)
+    if args.scenario:
+        scenario = get_scenario(args.scenario)
+        grid = parameter_grid(np.linspace(*scenario.initial_speed_range, args.sweep),
+            np.linspace(*scenario.final_speed_range, args.sweep),
+            np.linspace(*scenario.heading_rate_increments_range, args.sweep))
+        batch = scenario.generate_batch(*grid)
+        for k, params in enumerate(zip(*grid)):
+            trajectories.append(Trajectory(batch[k].T))
+            labels.append("{} v0={:.2f} vf={:.2f} hri={:.5f}".format(scenario.name, *params))
+    if not trajectories:
+        parser.error("nothing to show: give paths or --scenario")
+
+    viewer = TrajectoryViewer(trajectories, labels)
+    viewer.show("{} trajectories".format(len(trajectories)))
+    if args.save:
+        plt.savefig(args.save)
+    else:
+        plt.show()
+    return viewer
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import math
+
+import numpy as np
+
+from trajectory_core import get_scenario
+
+# Closed-loop evaluation of generated trajectories with a kinematic bicycle model.
+#
+# Every vehicle is one element of the state arrays, so a batch of vehicles with different
+# controller gains or start poses is simulated in one pass of whole-array updates per time
+# step. The vehicle state is at the rear axle; the speed follows the trajectory's velocity
+# profile (looked up by arc length) through a proportional controller.
+#
+# Controllers:
+#   pure_pursuit: steers at the path point lookahead_time * speed + min_lookahead metres
+#                 ahead of the vehicle; gain is lookahead_time in seconds
+#   stanley:      steers the front axle onto the path, heading error plus
+#                 atan(gain * cross track error / (softening + speed))
+
+CONTROLLERS = ('pure_pursuit', 'stanley')
+
+def _wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+class SimulationResult:
+    # time: (steps,); every other array is (steps, vehicles). Errors are NaN once a vehicle
+    # has reached the end of the path.
+    def __init__(self, controller, gain, time, x, y, yaw, speed, steer, cross_track_error,
+            heading_error, finished):
+        self.controller = controller
+        self.gain = gain
+        self.time = time
+        self.x = x
+        self.y = y
+        self.yaw = yaw
+        self.speed = speed
+        self.steer = steer
+        self.cross_track_error = cross_track_error
+        self.heading_error = heading_error
+        self.finished = finished
+
+    # per-vehicle summaries
+    @property
+    def rms_cross_track_error(self):
+        return np.sqrt(np.nanmean(self.cross_track_error ** 2, axis=0))
+
+    @property
+    def max_cross_track_error(self):
+        return np.nanmax(np.abs(self.cross_track_error), axis=0)
+
+    @property
+    def rms_heading_error(self):
+        return np.sqrt(np.nanmean(self.heading_error ** 2, axis=0))
+
+    def __str__(self):
+        lines = ["{} ({} steps, {:.2f}s)".format(self.controller, len(self.time), self.time[-1]),
+            "{:>10} {:>10} {:>10} {:>12} {:>9}".format('gain', 'rms cte/m', 'max cte/m',
+                'rms head/rad', 'finished')]
+        for values in zip(self.gain, self.rms_cross_track_error, self.max_cross_track_error,
+                self.rms_heading_error, self.finished):
+            lines.append("{:>10.4g} {:>10.4f} {:>10.4f} {:>12.5f} {:>9}".format(*values[:4],
+                'yes' if values[4] else 'no'))
+        return "\n".join(lines)
+
+# Simulates one vehicle per element of the broadcast gain / initial offsets along
+# trajectory. initial_lateral_offset (m, positive left) and initial_heading_error (rad)
+# displace the start pose from the path start. The run ends when every vehicle has
+# reached the end of the path or after max_time seconds (by default twice the
+# trajectory's duration plus 10s).
+def simulate(trajectory, controller='pure_pursuit', gain=1.0, initial_lateral_offset=0.0,
+        initial_heading_error=0.0, wheelbase=2.7, max_steer=0.6, dt=0.05, max_time=None,
+        min_lookahead=2.0, softening=1.0, speed_gain=1.0, max_accel=3.0, min_speed=0.5):
+    if controller not in CONTROLLERS:
+        raise ValueError("unknown controller %r, expected one of: %s"
+            % (controller, ", ".join(CONTROLLERS)))
+    gain, lateral_offset, heading_offset = (np.ravel(a).astype(np.float64) for a in
+        np.broadcast_arrays(gain, initial_lateral_offset, initial_heading_error))
+    count = len(gain)
+    index = trajectory.path_index()
+    path_end = index.arc_length[-1]
+    target_speed = np.asarray(trajectory.longitudinal_velocity_mps)
+    if max_time is None:
+        max_time = 2 * trajectory.time_from_start[-1] + 10.0
+    steps = int(math.ceil(max_time / dt)) + 1
+
+    start_heading = index.segment_heading[0]
+    x = index.x[0] - lateral_offset * math.sin(start_heading)
+    y = index.y[0] + lateral_offset * math.cos(start_heading)
+    yaw = start_heading + heading_offset
+    speed = np.full(count, max(float(target_speed[0]), min_speed))
+    hint = np.zeros(count, dtype=np.int64)
+    front_hint = np.zeros(count, dtype=np.int64)
+    active = np.ones(count, dtype=bool)
+
+    history = {name: np.full((steps, count), np.nan) for name in
+        ('x', 'y', 'yaw', 'speed', 'steer', 'cross_track_error', 'heading_error')}
+    step = 0
+    for step in range(steps):
+        projection = index.project(x, y, hint)
+        hint = projection.index
+        active &= projection.arc_length < path_end - 1e-6
+        if controller == 'pure_pursuit':
+            lookahead = gain * speed + min_lookahead
+            tx, ty, _ = index.point_at(projection.arc_length + lookahead)
+            alpha = np.arctan2(ty - y, tx - x) - yaw
+            steer = np.arctan2(2.0 * wheelbase * np.sin(alpha), lookahead)
+        else:
+            front = index.project(x + wheelbase * np.cos(yaw), y + wheelbase * np.sin(yaw),
+                front_hint)
+            front_hint = front.index
+            steer = _wrap(front.heading - yaw) \
+                - np.arctan(gain * front.lateral_offset / (softening + speed))
+        steer = np.clip(steer, -max_steer, max_steer)
+
+        row = {'x': x, 'y': y, 'yaw': yaw, 'speed': speed, 'steer': steer,
+            'cross_track_error': projection.lateral_offset,
+            'heading_error': _wrap(yaw - projection.heading)}
+        for name, values in row.items():
+            history[name][step] = np.where(active, values, np.nan)
+        if not active.any():
+            break
+
+        wanted = np.maximum(np.interp(projection.arc_length, index.arc_length, target_speed),
+            min_speed)
+        accel = np.clip(speed_gain * (wanted - speed), -max_accel, max_accel)
+        moving = np.where(active, speed, 0.0)
+        x = x + moving * np.cos(yaw) * dt
+        y = y + moving * np.sin(yaw) * dt
+        yaw = _wrap(yaw + moving / wheelbase * np.tan(steer) * dt)
+        speed = np.maximum(speed + accel * dt, 0.0)
+
+    steps = step + 1
+    return SimulationResult(controller, gain, np.arange(steps) * dt,
+        *(history[name][:steps] for name in ('x', 'y', 'yaw', 'speed', 'steer',
+            'cross_track_error', 'heading_error')), ~active)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Track a scenario's trajectory with a "
+        "kinematic bicycle model and report the tracking errors.")
+    parser.add_argument('scenario')
+    parser.add_argument('--controller', choices=CONTROLLERS, default='pure_pursuit')
+    parser.add_argument('--gain', type=float, nargs='+', default=[1.0],
+        help="one vehicle per gain: lookahead time (s) for pure_pursuit, k for stanley")
+    parser.add_argument('--lateral-offset', type=float, default=0.0,
+        help="initial offset from the path in metres, positive left")
+    parser.add_argument('--heading-error', type=float, default=0.0,
+        help="initial heading error in radians")
+    parser.add_argument('--dt', type=float, default=0.05)
+    args = parser.parse_args(args)
+
+    result = simulate(get_scenario(args.scenario).generate(), args.controller, args.gain,
+        args.lateral_offset, args.heading_error, dt=args.dt)
+    print(result)
+    return result
+
+if __name__ == '__main__':
+    main()